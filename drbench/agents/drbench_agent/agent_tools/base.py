@@ -1,16 +1,19 @@
 import datetime
+import functools
+import itertools
 import json
 import os
 import re
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
 
 from drbench.agents.utils import prompt_llm
 from drbench.drbench_enterprise_space import DrBenchEnterpriseSearchSpace
 
 
-@dataclass
+@dataclass(slots=True)
 class ResearchContext:
     """Accumulates research findings and context throughout the process with bounded memory"""
 
@@ -61,12 +64,15 @@ class ResearchContext:
 
     def get_context_summary(self) -> Dict[str, Any]:
         """Get a condensed summary suitable for LLM context"""
+        # Walk back from the newest finding instead of materializing every item
+        recent_keys = list(itertools.islice(reversed(self.findings), 5))
+        recent_keys.reverse()
         return {
             "question": self.original_question,
             "findings_count": len(self.findings),
             "archived_count": len(self.findings_archive),
             "categories": list(self.findings_summary.keys()),
-            "recent_findings": {k: self._summarize_finding(v) for k, v in list(self.findings.items())[-5:]},
+            "recent_findings": {k: self._summarize_finding(self.findings[k]) for k in recent_keys},
             "category_summaries": self.findings_summary,
         }
 
@@ -290,13 +296,15 @@ class ToolRegistry:
 
     def __init__(self):
         self.tools: List[Tool] = []
+        self._tools_tuple: Tuple[Tool, ...] = ()
 
     def register_tool(self, tool: Tool):
         self.tools.append(tool)
+        self._tools_tuple = tuple(self.tools)
 
-    def select_tools(self, query: str = None, context: ResearchContext = None) -> List[Tool]:
+    def select_tools(self, query: str = None, context: ResearchContext = None) -> Tuple[Tool, ...]:
         """Return all available tools - let action planner handle intelligent selection"""
-        return self.tools
+        return self._tools_tuple
 
 
 class FileManager:
@@ -321,49 +329,20 @@ class FileManager:
             return f"Error reading file: {str(e)}"
 
 
-class QueryPlanner:
-    """Plans research sections and generates sub-queries"""
-
-    def __init__(self, model: str):
-        self.model = model
-
-    def create_research_plan(
-        self,
-        question: str,
-        tool_registry: ToolRegistry = None,
-        env: Optional[DrBenchEnterpriseSearchSpace] = None,
-    ) -> Dict:
-        """Generate structured research plan with sections and sub-queries"""
-
-        # TODO: Add description, too
-        available_tools = [f"{tool.__class__.__name__}" for tool in tool_registry.tools]
-
-        enterprise_services = []
-        if env is not None:
-            enterprise_services = env.get_available_apps()
-            enterprise_services = [
-                f"{service['name']}: {service['description']}" for service in enterprise_services.values()
-            ]
-        tools_section = f"""
-Available Research Tools:
-{chr(10).join(f"- {tool}" for tool in available_tools)}
+# Planning prompt template; substituted with $question and $tools_section per call
+_PLANNING_PROMPT_TEMPLATE = Template(
+    """
+Design a comprehensive enterprise research strategy for: "$question"
 
-Available Enterprise Services:
-{chr(10).join(f"- {service}" for service in enterprise_services)}
-"""
-
-        planning_prompt = f"""
-Design a comprehensive enterprise research strategy for: "{question}"
-
-{tools_section}
+$tools_section
 
 As a senior enterprise researcher with deep business intelligence expertise, create a thorough investigation plan that combines rigorous research methodology with strategic business analysis. Your goal is to provide insights that drive informed decision-making in complex enterprise environments.
 
 Generate a JSON object with strategic research investigation areas:
 
-{{
+{
   "research_investigation_areas": [
-    {{
+    {
       "area_id": 1,
       "research_focus": "Core strategic domain, market segment, or business hypothesis to investigate",
       "information_needs": ["What specific intelligence is required for strategic decisions"],
@@ -374,16 +353,16 @@ Generate a JSON object with strategic research investigation areas:
       "expected_insights": "What strategic understanding or competitive intelligence this area should provide",
       "stakeholder_impact": "Which business units or decision-makers will benefit from these insights",
       "importance_level": "critical" | "important" | "supplementary"
-    }}
+    }
   ],
-  "research_methodology": {{
+  "research_methodology": {
     "overall_approach": "Description of the integrated research and business intelligence strategy",
     "competitive_positioning": "How this research will inform competitive advantage",
     "knowledge_synthesis": "How different investigation areas will be integrated for strategic recommendations",
     "internal_leverage": "How to maximize insights from proprietary enterprise data and systems",
     "external_validation": "How external market data and industry intelligence will validate internal findings"
-  }}
-}}
+  }
+}
 
 Enterprise Research Design Principles:
 - Adopt an enterprise researcher mindset: combine analytical rigor with business acumen
@@ -397,6 +376,45 @@ Enterprise Research Design Principles:
 - Integrate competitive intelligence, market analysis, and internal performance data
 - Design for both immediate tactical insights and longer-term strategic understanding
 """
+)
+
+
+@functools.lru_cache(maxsize=4)
+def _build_tools_section(tool_names: Tuple[str, ...], services: Tuple[Tuple[str, str], ...]) -> str:
+    """Render the tools/services block of the planning prompt (cached per distinct input)"""
+    return f"""
+Available Research Tools:
+{chr(10).join(f"- {tool}" for tool in tool_names)}
+
+Available Enterprise Services:
+{chr(10).join(f"- {name}: {description}" for name, description in services)}
+"""
+
+
+class QueryPlanner:
+    """Plans research sections and generates sub-queries"""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def create_research_plan(
+        self,
+        question: str,
+        tool_registry: ToolRegistry = None,
+        env: Optional[DrBenchEnterpriseSearchSpace] = None,
+    ) -> Dict:
+        """Generate structured research plan with sections and sub-queries"""
+
+        # TODO: Add description, too
+        tool_names = tuple(tool.__class__.__name__ for tool in tool_registry.select_tools())
+
+        services = ()
+        if env is not None:
+            services = tuple(
+                (service["name"], service["description"]) for service in env.get_available_apps().values()
+            )
+        tools_section = _build_tools_section(tool_names, services)
+        planning_prompt = _PLANNING_PROMPT_TEMPLATE.safe_substitute(question=question, tools_section=tools_section)
 
         response = prompt_llm(model=self.model, prompt=planning_prompt)
         try:
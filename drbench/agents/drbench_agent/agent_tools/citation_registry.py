@@ -5,16 +5,157 @@ This module implements a unified citation registry with deferred citation resolu
 to eliminate citation duplication and ensure sequential numbering.
 """
 
+import itertools
 import logging
 import re
-from collections import OrderedDict
+import sys
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+_LEGACY_RE = re.compile(r"\[\^(\d+)\]")
+_EMAIL_DATE_RE = re.compile(r"\d{1,2}\s+\w{3}\s+\d{4}")
 
-@dataclass
+_DOC_PREFIX = "[DOC:"
+
+
+def _find_doc_reference(text: str, pos: int = 0) -> Tuple[int, int]:
+    """
+    Locate the next [DOC:doc_id] reference at or after pos.
+
+    A reference is "[DOC:" followed by a non-empty doc_id and the next "]".
+    Uses a literal str.find scan for the prefix instead of stepping a regex
+    through the (mostly citation-free) report text.
+
+    Returns:
+        (start, end) indices of the opening "[" and closing "]", or (-1, -1)
+    """
+    prefix_len = len(_DOC_PREFIX)
+    start = text.find(_DOC_PREFIX, pos)
+    while start != -1:
+        end = text.find("]", start + prefix_len)
+        if end == -1:
+            break
+        if end > start + prefix_len:
+            return start, end
+        # "[DOC:]" has an empty doc_id and is not a reference
+        start = text.find(_DOC_PREFIX, start + 1)
+    return -1, -1
+
+
+def _replace_doc_references(text: str, resolve: Callable[[str], str]) -> str:
+    """Replace every [DOC:doc_id] reference in text with resolve(doc_id)."""
+    prefix_len = len(_DOC_PREFIX)
+    parts: List[str] = []
+    pos = 0
+    start, end = _find_doc_reference(text)
+    while start != -1:
+        parts.append(text[pos:start])
+        parts.append(resolve(text[start + prefix_len : end]))
+        pos = end + 1
+        start, end = _find_doc_reference(text, pos)
+
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def _format_email_reference(citation_num: int, title: str, source_info: dict) -> str:
+    # Format: [^1]: Email Subject - Email from sender@domain.com on YYYY-MM-DD
+    get = source_info.get
+    sender = get("sender", get("from", "Unknown Sender"))
+    date = get("date", "Unknown Date")
+
+    # Clean up sender email (extract just email part if it has name)
+    # Extract email from "Name <email@domain.com>" format
+    _, lt, rest = sender.partition("<")
+    if lt and ">" in rest:
+        sender = rest.partition(">")[0]
+
+    # Clean up date (just take the date part, not full timestamp)
+    if date and len(date) > 10:
+        # Try to extract just the date part from longer timestamps
+        date_match = _EMAIL_DATE_RE.search(date)
+        if date_match:
+            date = date_match.group(0)
+        elif len(date) > 25:
+            date = date[:25] + "..."
+
+    return f"[^{citation_num}]: **{title}** - Email from {sender} on {date}"
+
+
+def _format_chat_reference(citation_num: int, title: str, source_info: dict) -> str:
+    # Format: [^3]: Enterprise Chat - Message from user in team/channel
+    get = source_info.get
+    user = get("user", "Unknown User")
+    channel = get("channel", "Unknown Channel")
+    team = get("team", "")
+
+    # Build location string
+    location = f"Channel: {channel}"
+    if team and team != "unknown":
+        location = f"Team: {team}, {location}"
+
+    return f"[^{citation_num}]: **{title}** - Enterprise Chat (User: {user}, {location})"
+
+
+def _format_internal_reference(citation_num: int, title: str, source_info: dict) -> str:
+    return f"[^{citation_num}]: **{title}** - Internal Document (`{source_info.get('path', 'Unknown Path')}`)"
+
+
+def _format_external_reference(citation_num: int, title: str, source_info: dict) -> str:
+    url = source_info.get("url", "")
+    if url and url != "Unknown URL":
+        return f"[^{citation_num}]: **{title}** - Web Source ([{url}]({url}))"
+    else:
+        return f"[^{citation_num}]: **{title}** - Web Source"
+
+
+def _format_file_reference(citation_num: int, title: str, source_info: dict) -> str:
+    get = source_info.get
+    server = get("server", "Enterprise Server")
+    path = get("path", "Unknown Path")
+
+    # For Nextcloud, clean up path to show user-friendly format
+    if "nextcloud" in server.lower() and "/files/" in path:
+        # Remove everything up to and including "/files/{username}/"
+        user_friendly_path = path.split("/files/", 1)[1]
+        user_friendly_path = user_friendly_path.split("/", 1)[1] if "/" in user_friendly_path else user_friendly_path
+        return f"[^{citation_num}]: **{title}** - {server} File (`{user_friendly_path}`)"
+    else:
+        return f"[^{citation_num}]: **{title}** - {server} File (`{path}`)"
+
+
+def _format_api_reference(citation_num: int, title: str, source_info: dict) -> str:
+    tool = source_info.get("source_tool", "Unknown Tool")
+    return f"[^{citation_num}]: **{title}** - Enterprise API ({tool})"
+
+
+def _format_default_reference(citation_num: int, title: str, source_info: dict) -> str:
+    get = source_info.get
+    source = get("source", "Unknown source")
+    url = get("url", "")
+    if url:
+        return f"[^{citation_num}]: **{title}** - {source} ({url})"
+    else:
+        return f"[^{citation_num}]: **{title}** - {source}"
+
+
+# Reference formatters keyed by source_info["type"]; unknown types use _format_default_reference
+_REFERENCE_FORMATTERS: Dict[str, Callable[[int, str, dict], str]] = {
+    "enterprise_email": _format_email_reference,
+    "email_message": _format_email_reference,
+    "enterprise_chat": _format_chat_reference,
+    "internal": _format_internal_reference,
+    "external": _format_external_reference,
+    "enterprise_file": _format_file_reference,
+    "enterprise_api": _format_api_reference,
+}
+
+
+@dataclass(slots=True)
 class DocumentInfo:
     """Information about a document for citation purposes."""
 
@@ -42,6 +183,34 @@ class UnifiedCitationRegistry:
         self.appearance_order: List[str] = []  # ordered list of first appearances
         self.processed_sections: List[str] = []  # track document order
         self._citation_counter = 0
+        self._references_cache: Optional[str] = None  # cleared whenever the registry changes
+
+        # Read-only lookup layout built by freeze()
+        self._frozen = False
+        self._doc_index: Dict[str, int] = {}
+        self._doc_types: Tuple[str, ...] = ()
+        self._doc_source_infos: Tuple[dict, ...] = ()
+        self._doc_citation_numbers: Tuple[Optional[int], ...] = ()
+
+    def freeze(self) -> None:
+        """
+        Make the registry read-only once citations have been finalized.
+
+        Flattens the document table into parallel tuples indexed by doc_id, which
+        get_citation_number, the references section and statistics read instead of
+        walking DocumentInfo objects, so call it before generating references.
+        register_document, register_documents and finalize_citations raise
+        RuntimeError afterwards.
+        """
+        self._doc_index = {doc_id: i for i, doc_id in enumerate(self.documents)}
+        self._doc_types = tuple(doc.document_type for doc in self.documents.values())
+        self._doc_source_infos = tuple(doc.source_info for doc in self.documents.values())
+        self._doc_citation_numbers = tuple(self.citation_assignments.get(doc_id) for doc_id in self.documents)
+        self._frozen = True
+
+    def _check_not_frozen(self) -> None:
+        if self._frozen:
+            raise RuntimeError("Citation registry is frozen; create a new registry to register or finalize again")
 
     def register_document(
         self,
@@ -59,16 +228,58 @@ class UnifiedCitationRegistry:
             underlying_docs: List of underlying document IDs (for AI synthesis)
             document_type: Type of document ('regular' or 'ai_synthesis')
         """
+        self._check_not_frozen()
+
+        # Interned ids let lookups of ids scanned from report text hit on identity
+        doc_id = sys.intern(doc_id)
         if doc_id in self.documents:
-            logger.debug(f"Document {doc_id} already registered, skipping")
+            logger.debug("Document %s already registered, skipping", doc_id)
             return
 
-        self.documents[doc_id] = DocumentInfo(
+        self._references_cache = None
+        self.documents[doc_id] = self._build_document_info(doc_id, source_info, underlying_docs, document_type)
+
+        logger.debug("Registered document %s of type %s", doc_id, document_type)
+
+    def register_documents(self, entries: Iterable[Tuple[str, dict, Optional[List[str]], str]]) -> None:
+        """
+        Register many documents at once.
+
+        Equivalent to calling register_document for each entry in order
+        (the first registration of a doc_id wins), with a single update of
+        the document table.
+
+        Args:
+            entries: (doc_id, source_info, underlying_docs, document_type) tuples
+        """
+        self._check_not_frozen()
+
+        new_documents: Dict[str, DocumentInfo] = {}
+        for doc_id, source_info, underlying_docs, document_type in entries:
+            doc_id = sys.intern(doc_id)
+            if doc_id in self.documents or doc_id in new_documents:
+                continue
+            new_documents[doc_id] = self._build_document_info(doc_id, source_info, underlying_docs, document_type)
+
+        if new_documents:
+            self._references_cache = None
+            self.documents.update(new_documents)
+
+        logger.debug("Registered %d documents in bulk", len(new_documents))
+
+    @staticmethod
+    def _build_document_info(
+        doc_id: str, source_info: dict, underlying_docs: Optional[List[str]], document_type: str
+    ) -> DocumentInfo:
+        # Truncate long titles once here rather than every time the reference is formatted
+        title = source_info.get("title")
+        if title and len(title) > 200:
+            source_info = {**source_info, "title": title[:197] + "..."}
+
+        return DocumentInfo(
             doc_id=doc_id, source_info=source_info, underlying_docs=underlying_docs or [], document_type=document_type
         )
 
-        logger.debug(f"Registered document {doc_id} of type {document_type}")
-
     def finalize_citations(self, final_text: str) -> Tuple[str, Dict[str, int]]:
         """
         Scan final text and assign citation numbers based on appearance order.
@@ -83,71 +294,64 @@ class UnifiedCitationRegistry:
         Returns:
             Tuple of (processed_text with [^N] citations, citation_assignments dict)
         """
-        # Reset citation counter for fresh numbering
-        self._citation_counter = 0
-        self.citation_assignments.clear()
-        self.appearance_order.clear()
+        self._reset_citations()
 
-        # Find all [DOC:doc_id] references in order
-        doc_pattern = r"\[DOC:([^\]]+)\]"
-        doc_matches = list(re.finditer(doc_pattern, final_text))
+        # Nothing to resolve - skip the scan entirely
+        if _DOC_PREFIX not in final_text:
+            return final_text, self.citation_assignments
 
-        # Track which docs have been seen
-        seen_docs: Set[str] = set()
+        def replace_doc_reference(doc_id: str) -> str:
+            citation_num = self._assign_citation(doc_id)
+            return f"[^{citation_num}]" if citation_num is not None else ""
 
-        # First pass: Assign citation numbers based on first appearance
-        for match in doc_matches:
-            doc_id = match.group(1)
+        # Perform the replacement
+        processed_text = _replace_doc_references(final_text, replace_doc_reference)
 
-            if doc_id not in self.documents:
-                logger.warning(f"Document {doc_id} not registered, skipping")
-                continue
+        logger.info("Finalized %d citations", self._citation_counter)
 
-            doc_info = self.documents[doc_id]
+        return processed_text, self.citation_assignments
 
-            # Skip AI synthesis documents - they don't get citation numbers
-            # Their content should be used directly with preserved underlying citations
-            if doc_info.document_type == "ai_synthesis":
-                continue
+    def _reset_citations(self) -> None:
+        self._check_not_frozen()
 
-            # Regular documents get citation numbers
-            if doc_id not in seen_docs:
-                seen_docs.add(doc_id)
-                self._citation_counter += 1
-                self.citation_assignments[doc_id] = self._citation_counter
-                self.appearance_order.append(doc_id)
-
-        # Second pass: Replace [DOC:doc_id] with [^N] citations
-        def replace_doc_reference(match: re.Match[str]) -> str:
-            doc_id = match.group(1)
-
-            if doc_id not in self.documents:
-                logger.warning(f"Removing unregistered document reference: {doc_id}")
-                return ""
-
-            doc_info = self.documents[doc_id]
-
-            # Handle AI synthesis documents by removing them (no citation numbers)
-            if doc_info.document_type == "ai_synthesis":
-                logger.debug(
-                    f"Removing AI synthesis reference {doc_id} (content should have preserved underlying citations)"
-                )
-                return ""
-
-            # Regular documents get citation numbers
-            if doc_id in self.citation_assignments:
-                citation_num = self.citation_assignments[doc_id]
-                return f"[^{citation_num}]"
-            else:
-                logger.warning(f"No citation assigned for {doc_id}")
-                return ""
+        # Reset citation counter for fresh numbering
+        self._references_cache = None
+        self._citation_counter = 0
+        self.citation_assignments.clear()
+        self.appearance_order.clear()
 
-        # Perform the replacement
-        processed_text = re.sub(doc_pattern, replace_doc_reference, final_text)
+    def _assign_citation(self, doc_id: str) -> Optional[int]:
+        """
+        Resolve one [DOC:doc_id] reference during finalization.
 
-        logger.info(f"Finalized {self._citation_counter} citations")
+        References are resolved in appearance order, so the next citation number
+        is assigned on the first sighting of each regular document.
 
-        return processed_text, self.citation_assignments
+        Returns:
+            The citation number, or None if the reference should be removed
+        """
+        doc_id = sys.intern(doc_id)
+        if doc_id not in self.documents:
+            logger.warning("Removing unregistered document reference: %s", doc_id)
+            return None
+
+        doc_info = self.documents[doc_id]
+
+        # Handle AI synthesis documents by removing them (no citation numbers)
+        # Their content should be used directly with preserved underlying citations
+        if doc_info.document_type == "ai_synthesis":
+            logger.debug(
+                "Removing AI synthesis reference %s (content should have preserved underlying citations)", doc_id
+            )
+            return None
+
+        # Regular documents get citation numbers
+        if doc_id not in self.citation_assignments:
+            self._citation_counter += 1
+            self.citation_assignments[doc_id] = self._citation_counter
+            self.appearance_order.append(doc_id)
+
+        return self.citation_assignments[doc_id]
 
     def get_citation_number(self, doc_id: str) -> Optional[int]:
         """
@@ -159,6 +363,9 @@ class UnifiedCitationRegistry:
         Returns:
             Citation number if assigned, None otherwise
         """
+        if self._frozen:
+            idx = self._doc_index.get(doc_id)
+            return self._doc_citation_numbers[idx] if idx is not None else None
         return self.citation_assignments.get(doc_id)
 
     def generate_references_section(self) -> str:
@@ -171,22 +378,28 @@ class UnifiedCitationRegistry:
         if not self.citation_assignments:
             return "\n## References\n\nNo references cited."
 
-        # Create ordered dict by citation number
-        ordered_refs = OrderedDict()
-        for doc_id, citation_num in sorted(self.citation_assignments.items(), key=lambda x: x[1]):
-            if doc_id in self.documents:
-                doc_info = self.documents[doc_id]
-                # Skip AI synthesis documents as they don't have direct citations
-                if doc_info.document_type != "ai_synthesis":
-                    ordered_refs[citation_num] = doc_info.source_info
-
-        # Format references
-        references = ["\n## References\n"]
-        for citation_num, source_info in ordered_refs.items():
-            ref_text = self._format_reference(citation_num, source_info)
-            references.append(ref_text)
+        if self._references_cache is not None:
+            return self._references_cache
+
+        # Citation numbers are assigned in appearance order starting at 1,
+        # so appearance_order is already sorted by citation number
+        # AI synthesis documents are skipped as they don't have direct citations
+        if self._frozen:
+            doc_index, doc_types, doc_source_infos = self._doc_index, self._doc_types, self._doc_source_infos
+            references = (
+                self._format_reference(citation_num, doc_source_infos[idx])
+                for citation_num, doc_id in enumerate(self.appearance_order, start=1)
+                if (idx := doc_index.get(doc_id)) is not None and doc_types[idx] != "ai_synthesis"
+            )
+        else:
+            references = (
+                self._format_reference(citation_num, doc_info.source_info)
+                for citation_num, doc_id in enumerate(self.appearance_order, start=1)
+                if (doc_info := self.documents.get(doc_id)) is not None and doc_info.document_type != "ai_synthesis"
+            )
 
-        return "\n\n".join(references)
+        self._references_cache = "\n\n".join(itertools.chain(("\n## References\n",), references))
+        return self._references_cache
 
     def _format_reference(self, citation_num: int, source_info: dict) -> str:
         """
@@ -199,90 +412,10 @@ class UnifiedCitationRegistry:
         Returns:
             Formatted reference string
         """
-        title = source_info.get("title", "Untitled")
-        source = source_info.get("source", "Unknown source")
-        source_type = source_info.get("type", "")
-        url = source_info.get("url", "")
-
-        # Truncate long titles
-        if len(title) > 200:
-            title = title[:197] + "..."
-
-        # Handle different source types
-        if source_type == "enterprise_email" or source_type == "email_message":
-            # Format: [^1]: Email Subject - Email from sender@domain.com on YYYY-MM-DD
-            sender = source_info.get("sender", source_info.get("from", "Unknown Sender"))
-            date = source_info.get("date", "Unknown Date")
-
-            # Clean up sender email (extract just email part if it has name)
-            if "<" in sender and ">" in sender:
-                # Extract email from "Name <email@domain.com>" format
-                sender = sender.split("<")[1].split(">")[0]
-
-            # Clean up date (just take the date part, not full timestamp)
-            if date and len(date) > 10:
-                # Try to extract just the date part from longer timestamps
-                import re
-
-                date_match = re.search(r"\d{1,2}\s+\w{3}\s+\d{4}", date)
-                if date_match:
-                    date = date_match.group(0)
-                elif len(date) > 25:
-                    date = date[:25] + "..."
-
-            return f"[^{citation_num}]: **{title}** - Email from {sender} on {date}"
-
-        elif source_type == "enterprise_chat":
-            # Format: [^3]: Enterprise Chat - Message from user in team/channel
-            user = source_info.get("user", "Unknown User")
-            channel = source_info.get("channel", "Unknown Channel")
-            team = source_info.get("team", "")
-
-            # Build location string
-            location = f"Channel: {channel}"
-            if team and team != "unknown":
-                location = f"Team: {team}, {location}"
-
-            return f"[^{citation_num}]: **{title}** - Enterprise Chat (User: {user}, {location})"
-
-        elif source_type == "internal":
-            return f"[^{citation_num}]: **{title}** - Internal Document (`{source_info.get('path', 'Unknown Path')}`)"
-
-        elif source_type == "external":
-            if url and url != "Unknown URL":
-                return f"[^{citation_num}]: **{title}** - Web Source ([{url}]({url}))"
-            else:
-                return f"[^{citation_num}]: **{title}** - Web Source"
-
-        elif source_type == "enterprise_file":
-            server = source_info.get("server", "Enterprise Server")
-            path = source_info.get("path", "Unknown Path")
-
-            # For Nextcloud, clean up path to show user-friendly format
-            if "nextcloud" in server.lower() and "/files/" in path:
-                # Remove everything up to and including "/files/{username}/"
-                if "/files/" in path:
-                    # Extract user-friendly path
-                    user_friendly_path = path.split("/files/", 1)[1]
-                    user_friendly_path = (
-                        user_friendly_path.split("/", 1)[1] if "/" in user_friendly_path else user_friendly_path
-                    )
-                else:
-                    user_friendly_path = path
-                return f"[^{citation_num}]: **{title}** - {server} File (`{user_friendly_path}`)"
-            else:
-                return f"[^{citation_num}]: **{title}** - {server} File (`{path}`)"
-
-        elif source_type == "enterprise_api":
-            tool = source_info.get("source_tool", "Unknown Tool")
-            return f"[^{citation_num}]: **{title}** - Enterprise API ({tool})"
-
-        else:
-            # Default format
-            if url:
-                return f"[^{citation_num}]: **{title}** - {source} ({url})"
-            else:
-                return f"[^{citation_num}]: **{title}** - {source}"
+        get = source_info.get
+        title = get("title", "Untitled")
+        formatter = _REFERENCE_FORMATTERS.get(get("type", ""), _format_default_reference)
+        return formatter(citation_num, title, source_info)
 
     def get_statistics(self) -> dict:
         """
@@ -291,7 +424,10 @@ class UnifiedCitationRegistry:
         Returns:
             Dictionary with citation statistics
         """
-        ai_synthesis_count = sum(1 for doc in self.documents.values() if doc.document_type == "ai_synthesis")
+        if self._frozen:
+            ai_synthesis_count = self._doc_types.count("ai_synthesis")
+        else:
+            ai_synthesis_count = sum(1 for doc in self.documents.values() if doc.document_type == "ai_synthesis")
         regular_count = len(self.documents) - ai_synthesis_count
 
         return {
@@ -311,26 +447,26 @@ class UnifiedCitationRegistry:
             old_source_registry: Legacy source registry
             old_ai_insights: Legacy AI synthesis insights
         """
-        # Migrate regular sources
-        for doc_id, source_data in old_source_registry.items():
-            if source_data.get("citation_id") != "skip":
-                self.register_document(
-                    doc_id=doc_id, source_info=source_data.get("source_info", {}), document_type="regular"
-                )
-
-        # Migrate AI synthesis documents
-        for doc_id, insight_data in old_ai_insights.items():
-            underlying_docs = insight_data.get("source_document_ids", [])
-            self.register_document(
-                doc_id=doc_id,
-                source_info={
+        # Regular sources first, then AI synthesis documents
+        regular_entries = (
+            (doc_id, source_data.get("source_info", {}), None, "regular")
+            for doc_id, source_data in old_source_registry.items()
+            if source_data.get("citation_id") != "skip"
+        )
+        ai_synthesis_entries = (
+            (
+                doc_id,
+                {
                     "title": f"AI Synthesis: {doc_id}",
                     "source": "AI Analysis",
                     "synthesis_method": insight_data.get("synthesis_method", "unknown"),
                 },
-                underlying_docs=underlying_docs,
-                document_type="ai_synthesis",
+                insight_data.get("source_document_ids", []),
+                "ai_synthesis",
             )
+            for doc_id, insight_data in old_ai_insights.items()
+        )
+        self.register_documents(itertools.chain(regular_entries, ai_synthesis_entries))
 
         logger.info(f"Migrated {len(self.documents)} documents to unified registry")
 
@@ -349,8 +485,8 @@ class LegacyCitationSupport:
         Returns:
             'legacy' for [^N] format, 'new' for [DOC:id] format, 'mixed' for both
         """
-        has_legacy = bool(re.search(r"\[\^\d+\]", text))
-        has_new = bool(re.search(r"\[DOC:[^\]]+\]", text))
+        has_new = _find_doc_reference(text)[0] != -1
+        has_legacy = "[^" in text and _LEGACY_RE.search(text) is not None
 
         if has_legacy and has_new:
             return "mixed"
@@ -383,7 +519,7 @@ class LegacyCitationSupport:
                 logger.warning(f"No doc_id mapping for citation {citation_num}")
                 return match.group(0)
 
-        return re.sub(r"\[\^(\d+)\]", replace_citation, text)
+        return _LEGACY_RE.sub(replace_citation, text)
 
     @staticmethod
     def mixed_format_resolution(text: str, registry: UnifiedCitationRegistry) -> str:
@@ -3,19 +3,180 @@ Enhanced content processing system for DrBench Agent
 Handles file downloads, text extraction, and vector store integration
 """
 
+import contextlib
+import functools
+import hashlib
+import importlib.util
+import logging
 import mimetypes
+import mmap
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from drbench.agents.utils import prompt_llm
 
 from drbench.agents.drbench_agent.session_cache import SessionCache
 from drbench.agents.drbench_agent.vector_store import VectorStore
 
+logger = logging.getLogger(__name__)
+
+# Read size used when streaming downloads to disk
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Upper bound on concurrent downloads in download_from_enterprise_service
+MAX_DOWNLOAD_WORKERS = 16
+
+
+def _detect_pdf_backend() -> Optional[str]:
+    """Return the first installed PDF text backend, fastest (C-based) first"""
+    for name in ("pymupdf", "pypdfium2", "pdfplumber", "PyPDF2"):
+        if importlib.util.find_spec(name) is not None:
+            return name
+    return None
+
+
+# Resolved once at import so extraction doesn't pay for ImportError probing per file
+_PDF_BACKEND = _detect_pdf_backend()
+
+# Extractor method per canonical MIME type
+_MIME_TYPE_HANDLERS = {
+    "text/html": "_extract_from_html",
+    "application/pdf": "_extract_from_pdf",
+    "application/json": "_extract_from_json",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "_extract_from_docx",
+    "application/msword": "_extract_from_doc",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "_extract_from_xlsx",
+    "application/vnd.ms-excel": "_extract_from_xls",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": "_extract_from_pptx",
+    "application/vnd.ms-powerpoint": "_extract_from_ppt",
+}
+
+# Fallback extractors by file extension when the MIME type is missing or generic
+_EXTENSION_HANDLERS = {
+    ".xlsx": "_extract_from_xlsx",
+    ".xls": "_extract_from_xls",
+    ".pptx": "_extract_from_pptx",
+    ".ppt": "_extract_from_ppt",
+}
+
+# File extension appended to downloads that lack one, by canonical MIME type
+_MIME_TYPE_EXTENSIONS = {
+    "text/html": ".html",
+    "application/pdf": ".pdf",
+    "application/json": ".json",
+    "text/plain": ".txt",
+}
+
+
+# Declared types that say nothing about the payload, so the bytes are sniffed instead
+_GENERIC_MIME_TYPES = {"", "application/octet-stream", "binary/octet-stream", "application/download"}
+
+# Top-level folder inside an OOXML zip package that identifies the Office format
+_OOXML_FOLDER_TYPES = {
+    "word/": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xl/": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "ppt/": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
+
+# Leading bytes read when sniffing a file's type
+SNIFF_BYTES = 4096
+
+
+def _sniff_content_type(file_path: Path) -> Optional[str]:
+    """Identify a file's MIME type from its contents, or None if it can't be determined"""
+    with open(file_path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+
+    # Signatures for the formats we have dedicated extractors for
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                for name in archive.namelist():
+                    folder = name.partition("/")[0] + "/"
+                    if folder in _OOXML_FOLDER_TYPES:
+                        return _OOXML_FOLDER_TYPES[folder]
+        except zipfile.BadZipFile:
+            pass
+    elif head.lstrip()[:15].lower().startswith((b"<!doctype html", b"<html")):
+        return "text/html"
+
+    # Fall back to libmagic when python-magic is installed
+    try:
+        import magic
+
+        content_type = magic.from_buffer(head, mime=True)
+    except ImportError:
+        return None
+    return None if _canonical_mime_type(content_type or "") in _GENERIC_MIME_TYPES else content_type
+
+
+# Token budget for content sent to the source-extraction prompt
+SOURCE_EXTRACTION_MAX_TOKENS = 2048
+
+# Number of source-extraction results kept per ContentProcessor
+SOURCE_EXTRACTION_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _get_token_encoding(model: str):
+    """
+    Return the tiktoken encoding for model (cl100k_base for unknown models)
+
+    Returns None if no encoding can be loaded, e.g. when its files can't be fetched offline; the
+    failure is cached too so it isn't retried on every call.
+    """
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Token encoding for {model} unavailable, truncating by characters: {e}")
+        return None
+
+
+def _canonical_mime_type(content_type: str) -> str:
+    """Reduce a Content-Type value like 'Text/HTML; charset=utf-8' to 'text/html'"""
+    return content_type.partition(";")[0].strip().lower()
+
+
+# A whitespace run containing a line break (any str.splitlines boundary) or two consecutive spaces
+_HTML_WHITESPACE_GAP_RE = re.compile(r"\s*(?:[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]|  )\s*")
+
+# Files at least this large are decoded from a memory map instead of read into a bytes buffer first
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def _read_text_file(file_path: Path) -> str:
+    """Read a UTF-8 text file (undecodable bytes dropped), with the same newline handling as text mode"""
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            text = f.read().decode("utf-8", errors="ignore")
+        else:
+            # Decode straight from the page cache so peak heap is the str alone, not bytes + str
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, "utf-8", "ignore")
+
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
 
 class ContentProcessor:
     """Comprehensive content processing for files and URLs"""
@@ -32,6 +193,10 @@ class ContentProcessor:
         self.vector_store = vector_store
         self.model = model
         self.session_cache = session_cache
+        self._source_extraction_cache: Dict[str, Dict[str, Any]] = {}  # sample hash -> extracted sources
+        # process_url/process_file run on worker threads; this guards the caches above and below
+        self._state_lock = threading.Lock()
+        self._path_locks: Dict[Path, threading.Lock] = {}  # workspace file -> lock held while writing/reading it
 
         # Create subdirectories
         self.downloads_dir = self.workspace_dir / "downloads"
@@ -39,8 +204,20 @@ class ContentProcessor:
         self.downloads_dir.mkdir(exist_ok=True)
         self.extracted_dir.mkdir(exist_ok=True)
 
-        # Session for web requests
+        # Session for web requests; keep-alive pool sized for bulk downloads from the same host
         self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=64,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+                raise_on_status=False,  # Let raise_for_status() report the final response
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self.session.headers.update(
             {"User-Agent": "Mozilla/5.0 (compatible; DrBench-Agent/1.0; Research-Bot)", "Accept": "*/*"}
         )
@@ -56,59 +233,84 @@ class ContentProcessor:
         Returns:
             Processing result with extracted content and file paths
         """
+        # One clock read per call keeps the filename and metadata timestamps consistent
+        now = datetime.now()
+        timestamp = now.isoformat()
+
         try:
-            # Download content
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-
-            # Determine content type and file extension
-            content_type = response.headers.get("content-type", "").lower()
-            parsed_url = urlparse(url)
-
-            # Generate filename
-            if parsed_url.path:
-                filename = Path(parsed_url.path).name
-                if not filename or "." not in filename:
-                    filename = f"content_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            else:
-                filename = f"content_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-            # Add appropriate extension based on content type
-            if "text/html" in content_type and not filename.endswith(".html"):
-                filename += ".html"
-            elif "application/pdf" in content_type and not filename.endswith(".pdf"):
-                filename += ".pdf"
-            elif "application/json" in content_type and not filename.endswith(".json"):
-                filename += ".json"
-            elif "text/plain" in content_type and not filename.endswith(".txt"):
-                filename += ".txt"
-
-            # Save to downloads directory
-            file_path = self.downloads_dir / filename
-            with open(file_path, "wb") as f:
-                f.write(response.content)
-
-            # Extract text content
-            extracted_content = self.extract_text_from_file(file_path, content_type)
-
-            # Save extracted text
-            text_filename = f"{Path(filename).stem}_extracted.txt"
-            text_path = self.extracted_dir / text_filename
-            with open(text_path, "w", encoding="utf-8") as f:
-                f.write(extracted_content)
+            # Download content (body is streamed to disk below rather than buffered); closing the
+            # response on every path returns its pooled connection
+            with self.session.get(url, stream=True, timeout=(10, 30)) as response:
+                response.raise_for_status()
+
+                # Determine content type and file extension
+                content_type = response.headers.get("content-type", "").lower()
+                parsed_url = urlparse(url)
+
+                # Generate filename
+                if parsed_url.path:
+                    filename = Path(parsed_url.path).name
+                    if not filename or "." not in filename:
+                        filename = f"content_{now.strftime('%Y%m%d_%H%M%S')}"
+                else:
+                    filename = f"content_{now.strftime('%Y%m%d_%H%M%S')}"
+
+                # Add appropriate extension based on content type
+                extension = _MIME_TYPE_EXTENSIONS.get(_canonical_mime_type(content_type))
+                if extension and not filename.endswith(extension):
+                    filename += extension
+
+                # Save to downloads directory
+                file_path = self.downloads_dir / filename
+                # Different URLs can share a file name; keep concurrent downloads from interleaving
+                with self._exclusive_path(file_path):
+                    response.raw.decode_content = True  # Honor gzip/deflate content encodings
+                    # Hash while streaming so identical bytes served under another URL are recognized;
+                    # without a session cache there is nothing to match against
+                    payload_digest = hashlib.sha256() if self.session_cache else None
+                    with open(file_path, "wb") as f:
+                        while chunk := response.raw.read(DOWNLOAD_CHUNK_SIZE):
+                            if payload_digest:
+                                payload_digest.update(chunk)
+                            f.write(chunk)
+                    payload_hash = payload_digest.hexdigest() if payload_digest else None
+
+                    # Servers often label documents generically; trust the bytes over the header then
+                    if _canonical_mime_type(content_type) in _GENERIC_MIME_TYPES:
+                        content_type = _sniff_content_type(file_path) or content_type
+
+                    reused = self._reuse_extraction(payload_hash) if payload_hash else None
+                    if reused:
+                        known_doc_id, text_path, extracted_content = reused
+                    else:
+                        known_doc_id = None
+
+                        # Extract text content
+                        extracted_content = self.extract_text_from_file(file_path, content_type)
+
+                        # Save extracted text
+                        text_filename = f"{Path(filename).stem}_extracted.txt"
+                        text_path = self.extracted_dir / text_filename
+                        with self._exclusive_path(text_path), open(text_path, "w", encoding="utf-8") as f:
+                            f.write(extracted_content)
 
             # Check cache first
             doc_id = None
             cached = False
+            is_alias = False
 
             if self.session_cache:
                 # Check if URL has been processed
                 cached_doc_id = self.session_cache.check_source("url", url)
+                # The same payload under another URL is that URL's document; this URL becomes an alias
+                is_alias = not cached_doc_id and known_doc_id is not None
+                if is_alias:
+                    cached_doc_id = known_doc_id
                 if cached_doc_id:
                     doc_id = cached_doc_id
                     cached = True
                     # Update context in both session cache and vector store
-                    if query_context:
+                    if query_context or is_alias:
                         self.session_cache.add_document(
                             doc_id,
                             extracted_content,
@@ -118,13 +320,21 @@ class ContentProcessor:
                         )
                         # Also update vector store metadata
                         if self.vector_store:
-                            metadata = {
-                                "source": "url",
-                                "url": url,
-                                "source_identifier": url,
-                                "query_context": query_context,
-                                "timestamp": datetime.now().isoformat(),
-                            }
+                            if is_alias:
+                                # Keep the original url/source_identifier; only note where else it was seen
+                                metadata = {
+                                    "source_aliases": [url],
+                                    "query_context": query_context,
+                                    "timestamp": timestamp,
+                                }
+                            else:
+                                metadata = {
+                                    "source": "url",
+                                    "url": url,
+                                    "source_identifier": url,
+                                    "query_context": query_context,
+                                    "timestamp": timestamp,
+                                }
                             self.vector_store._merge_metadata(doc_id, metadata)
 
             # Store in vector store if available and not cached
@@ -136,7 +346,7 @@ class ContentProcessor:
                     "content_type": content_type,
                     "filename": filename,
                     "query_context": query_context,
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": timestamp,
                     "file_path": str(file_path),
                     "extracted_path": str(text_path),
                 }
@@ -156,6 +366,9 @@ class ContentProcessor:
                         query_context=query_context,
                     )
 
+            if self.session_cache and doc_id and not reused:
+                self.session_cache.add_payload(payload_hash, doc_id, str(text_path), extracted_content)
+
             return {
                 "success": True,
                 "url": url,
@@ -170,8 +383,42 @@ class ContentProcessor:
         except Exception as e:
             return {"success": False, "url": url, "error": str(e)}
 
+    def process_urls(self, urls: List[str], query_context: str = "") -> List[Dict[str, Any]]:
+        """
+        Download and process several URLs concurrently
+
+        While one URL is being embedded, others are downloading or being extracted, so throughput
+        tracks the slowest stage rather than the sum of stages.
+
+        Args:
+            urls: URLs to process (repeated URLs are fetched once)
+            query_context: Context about what we're researching
+
+        Returns:
+            Processing results in the same order as urls
+        """
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return []
+
+        with (
+            self._batched_metadata_saves() as batch,
+            ThreadPoolExecutor(max_workers=min(MAX_DOWNLOAD_WORKERS, len(unique_urls))) as executor,
+        ):
+            futures = [
+                executor.submit(self._in_metadata_batch, batch, self.process_url, url, query_context)
+                for url in unique_urls
+            ]
+            results = {url: future.result() for url, future in zip(unique_urls, futures)}
+
+        return [results[url] for url in urls]
+
     def process_file(
-        self, file_path: str, query_context: str = "", additional_metadata: Dict[str, Any] = None
+        self,
+        file_path: str,
+        query_context: str = "",
+        additional_metadata: Dict[str, Any] = None,
+        persist_extracted: bool = True,
     ) -> Dict[str, Any]:
         """
         Process an existing file (extract text and store in vector store)
@@ -180,33 +427,55 @@ class ContentProcessor:
             file_path: Path to file to process
             query_context: Context about what we're researching
             additional_metadata: Additional metadata to store with the document
+            persist_extracted: Write the extracted text to extracted_content/; when False the
+                result's extracted_path is None
 
         Returns:
             Processing result
         """
+        timestamp = datetime.now().isoformat()
+
         try:
             file_path = Path(file_path)
 
             if not file_path.exists():
                 return {"success": False, "file_path": str(file_path), "error": "File does not exist"}
 
-            # Determine content type
+            # Determine content type from the name, then from the bytes if the name doesn't tell
             content_type, _ = mimetypes.guess_type(str(file_path))
             if not content_type:
-                content_type = "application/octet-stream"
+                content_type = _sniff_content_type(file_path) or "application/octet-stream"
 
-            # Extract text content
-            extracted_content = self.extract_text_from_file(file_path, content_type)
+            # Identical bytes at another path reuse that file's extracted text and doc_id; the
+            # payload is only hashed when a session cache can remember it
+            if self.session_cache:
+                with open(file_path, "rb") as f:
+                    payload_hash = hashlib.file_digest(f, "sha256").hexdigest()
+                reused = self._reuse_extraction(payload_hash)
+            else:
+                payload_hash = reused = None
+
+            if reused:
+                known_doc_id, text_path, extracted_content = reused
+            else:
+                known_doc_id = None
 
-            # Save extracted text
-            text_filename = f"{file_path.stem}_extracted.txt"
-            text_path = self.extracted_dir / text_filename
-            with open(text_path, "w", encoding="utf-8") as f:
-                f.write(extracted_content)
+                # Extract text content
+                extracted_content = self.extract_text_from_file(file_path, content_type)
+
+                # Save extracted text
+                if persist_extracted:
+                    text_filename = f"{file_path.stem}_extracted.txt"
+                    text_path = self.extracted_dir / text_filename
+                    with self._exclusive_path(text_path), open(text_path, "w", encoding="utf-8") as f:
+                        f.write(extracted_content)
+                else:
+                    text_path = None
 
             # Check cache first
             doc_id = None
             cached = False
+            is_alias = False
 
             # Determine source identifier
             source_identifier = str(file_path)
@@ -228,12 +497,16 @@ class ContentProcessor:
                     # Check by source identifier
                     source_type = additional_metadata.get("source", "file") if additional_metadata else "file"
                     cached_doc_id = self.session_cache.check_source(source_type, source_identifier)
+                    # The same payload at another path is that file's document; this source becomes an alias
+                    is_alias = not cached_doc_id and known_doc_id is not None
+                    if is_alias:
+                        cached_doc_id = known_doc_id
                     if cached_doc_id:
                         doc_id = cached_doc_id
                         cached = True
 
                 # Update context if cached
-                if cached and query_context:
+                if cached and (query_context or is_alias):
                     self.session_cache.add_document(
                         doc_id,
                         extracted_content,
@@ -244,14 +517,17 @@ class ContentProcessor:
                     )
                     # Also update vector store metadata
                     if self.vector_store:
-                        metadata = {
-                            "source": additional_metadata.get("source", "file") if additional_metadata else "file",
-                            "source_identifier": source_identifier,
-                            "query_context": query_context,
-                            "timestamp": datetime.now().isoformat(),
-                        }
-                        if additional_metadata:
-                            metadata.update(additional_metadata)
+                        metadata = {"query_context": query_context, "timestamp": timestamp}
+                        if is_alias:
+                            # Keep the original document's identifiers; only note where else it was seen
+                            metadata["source_aliases"] = [source_identifier]
+                        else:
+                            metadata["source"] = (
+                                additional_metadata.get("source", "file") if additional_metadata else "file"
+                            )
+                            metadata["source_identifier"] = source_identifier
+                            if additional_metadata:
+                                metadata.update(additional_metadata)
                         self.vector_store._merge_metadata(doc_id, metadata)
 
             # Store in vector store if available and not cached
@@ -264,8 +540,8 @@ class ContentProcessor:
                     "content_type": content_type,
                     "filename": file_path.name,
                     "query_context": query_context,
-                    "timestamp": datetime.now().isoformat(),
-                    "extracted_path": str(text_path),
+                    "timestamp": timestamp,
+                    "extracted_path": str(text_path) if text_path else None,
                 }
 
                 # Add additional metadata if provided
@@ -285,10 +561,13 @@ class ContentProcessor:
                         query_context=query_context,
                     )
 
+            if self.session_cache and doc_id and text_path and not reused:
+                self.session_cache.add_payload(payload_hash, doc_id, str(text_path), extracted_content)
+
             return {
                 "success": True,
                 "file_path": str(file_path),
-                "extracted_path": str(text_path),
+                "extracted_path": str(text_path) if text_path else None,
                 "content_type": content_type,
                 "content_length": len(extracted_content),
                 "doc_id": doc_id,
@@ -298,6 +577,33 @@ class ContentProcessor:
         except Exception as e:
             return {"success": False, "file_path": str(file_path), "error": str(e)}
 
+    def _reuse_extraction(self, payload_hash: str) -> Optional[Tuple[str, Path, str]]:
+        """
+        Look up a payload already processed this session
+
+        Returns:
+            Tuple of (doc_id, extracted_path, extracted_text), or None if the payload is new
+            or its extracted text is no longer on disk as it was written
+        """
+        if not self.session_cache:
+            return None
+
+        known = self.session_cache.check_payload(payload_hash)
+        if not known:
+            return None
+
+        doc_id, extracted_path, text_hash = known
+        try:
+            with self._exclusive_path(Path(extracted_path)):
+                extracted_content = Path(extracted_path).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+        # Another document with the same file stem may have overwritten the extracted text since
+        if self.session_cache.compute_content_hash(extracted_content) != text_hash:
+            return None
+        return doc_id, Path(extracted_path), extracted_content
+
     def extract_text_from_file(self, file_path: Path, content_type: str = None) -> str:
         """
         Extract text from various file formats
@@ -316,127 +622,117 @@ class ContentProcessor:
             if not content_type:
                 content_type = "text/plain"
 
-            content_type = content_type.lower()
-
-            # Handle different file types
-            if "text/html" in content_type:
-                return self._extract_from_html(file_path)
-            elif "application/pdf" in content_type:
-                return self._extract_from_pdf(file_path)
-            elif "application/json" in content_type:
-                return self._extract_from_json(file_path)
-            elif content_type.startswith("text/"):
-                return self._extract_from_text(file_path)
-            elif "application/vnd.openxmlformats-officedocument.wordprocessingml.document" in content_type:
-                return self._extract_from_docx(file_path)
-            elif "application/msword" in content_type:
-                return self._extract_from_doc(file_path)
-            elif "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" in content_type:
-                return self._extract_from_xlsx(file_path)
-            elif "application/vnd.ms-excel" in content_type:
-                return self._extract_from_xls(file_path)
-            elif "application/vnd.openxmlformats-officedocument.presentationml.presentation" in content_type:
-                return self._extract_from_pptx(file_path)
-            elif "application/vnd.ms-powerpoint" in content_type:
-                return self._extract_from_ppt(file_path)
-            elif str(file_path).lower().endswith((".xlsx", ".xls")):
-                # Handle Excel files by extension if MIME type detection fails
-                if str(file_path).lower().endswith(".xlsx"):
-                    return self._extract_from_xlsx(file_path)
-                else:
-                    return self._extract_from_xls(file_path)
-            elif str(file_path).lower().endswith((".pptx", ".ppt")):
-                # Handle PowerPoint files by extension if MIME type detection fails
-                if str(file_path).lower().endswith(".pptx"):
-                    return self._extract_from_pptx(file_path)
+            # Handle different file types: exact MIME type first, then extension, then plain text
+            canonical_type = _canonical_mime_type(content_type)
+            handler_name = _MIME_TYPE_HANDLERS.get(canonical_type)
+            if handler_name is None:
+                if canonical_type.startswith("text/"):
+                    handler_name = "_extract_from_text"
                 else:
-                    return self._extract_from_ppt(file_path)
-            else:
-                # Try as text file as fallback
-                return self._extract_from_text(file_path)
+                    # Handle Office files by extension if MIME type detection fails
+                    handler_name = _EXTENSION_HANDLERS.get(Path(file_path).suffix.lower(), "_extract_from_text")
+
+            return getattr(self, handler_name)(file_path)
 
         except Exception as e:
             return f"Error extracting text from {file_path}: {str(e)}"
 
     def _extract_from_html(self, file_path: Path) -> str:
         """Extract text from HTML file"""
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
+        try:
+            from lxml import etree
 
-        soup = BeautifulSoup(content, "html.parser")
+            # libxml2 parses straight from the file, no Python-level tokenizing
+            tree = etree.parse(str(file_path), etree.HTMLParser(encoding="utf-8"))
+            if tree.getroot() is None:
+                return ""
 
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
+            # Remove script and style elements (keeping the text that follows them)
+            etree.strip_elements(tree, "script", "style", with_tail=False)
 
-        # Extract text
-        text = soup.get_text()
+            # Extract text
+            text = etree.tostring(tree, method="text", encoding="unicode")
 
-        # Clean up text
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        clean_text = " ".join(chunk for chunk in chunks if chunk)
+        except ImportError:
+            soup = BeautifulSoup(_read_text_file(file_path), "html.parser")
 
-        return clean_text
+            # Remove script and style elements
+            for script in soup(["script", "style"]):
+                script.decompose()
+
+            # Extract text
+            text = soup.get_text()
+
+        # Clean up text: collapse whitespace gaps that span a line break or a double space into one space
+        return _HTML_WHITESPACE_GAP_RE.sub(" ", text).strip()
 
     def _extract_from_pdf(self, file_path: Path) -> str:
-        """Extract text from PDF file"""
-        try:
-            import PyPDF2
+        """Extract text from PDF file using the fastest available backend"""
+        if _PDF_BACKEND == "pymupdf":
+            import pymupdf
 
-            with open(file_path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
+            with pymupdf.open(file_path) as doc:
+                text = "\n".join(page.get_text("text") for page in doc)
 
-            return text.strip()
+        elif _PDF_BACKEND == "pypdfium2":
+            import pypdfium2
 
-        except ImportError:
+            pdf = pypdfium2.PdfDocument(file_path)
             try:
-                import pdfplumber
+                text = "\n".join(page.get_textpage().get_text_range() for page in pdf)
+            finally:
+                pdf.close()
 
-                with pdfplumber.open(file_path) as pdf:
-                    text = ""
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
+        elif _PDF_BACKEND == "pdfplumber":
+            import pdfplumber
 
-                return text.strip()
+            with pdfplumber.open(file_path) as pdf:
+                text = "\n".join(page_text for page in pdf.pages if (page_text := page.extract_text()))
 
-            except ImportError:
-                return f"PDF processing libraries not available. Install PyPDF2 or pdfplumber to process PDF files. File: {file_path}"
+        elif _PDF_BACKEND == "PyPDF2":
+            import PyPDF2
+
+            with open(file_path, "rb") as f:
+                reader = PyPDF2.PdfReader(f)
+                text = "\n".join(page.extract_text() for page in reader.pages)
+
+        else:
+            return (
+                "PDF processing libraries not available. Install pymupdf, pypdfium2, pdfplumber or PyPDF2 "
+                f"to process PDF files. File: {file_path}"
+            )
+
+        return text.strip()
 
     def _extract_from_json(self, file_path: Path) -> str:
         """Extract text from JSON file"""
         import json
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        try:
+            import orjson
+
+            data = orjson.loads(file_path.read_bytes())
+        except (ImportError, ValueError):
+            # orjson missing, or input it rejects (e.g. integers beyond 64 bits) - use the stdlib parser
+            with open(file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
 
         # Convert JSON to readable text
         json_str = json.dumps(data, indent=2, ensure_ascii=False)
 
-        # Also try to extract any text values from the JSON structure
+        # Also try to extract any meaningful text values from the JSON structure, walking it
+        # depth-first in document order with an explicit stack instead of recursion
         text_content = []
-
-        def extract_text_values(obj, path=""):
+        stack = [(data, "")]
+        while stack:
+            obj, path = stack.pop()
             if isinstance(obj, dict):
-                for key, value in obj.items():
-                    new_path = f"{path}.{key}" if path else key
-                    if isinstance(value, str) and len(value) > 10:  # Meaningful text
-                        text_content.append(f"{new_path}: {value}")
-                    else:
-                        extract_text_values(value, new_path)
+                stack.extend((value, f"{path}.{key}" if path else key) for key, value in reversed(obj.items()))
             elif isinstance(obj, list):
-                for i, item in enumerate(obj):
-                    extract_text_values(item, f"{path}[{i}]")
+                stack.extend((obj[i], f"{path}[{i}]") for i in range(len(obj) - 1, -1, -1))
             elif isinstance(obj, str) and len(obj) > 10:
                 text_content.append(f"{path}: {obj}")
 
-        extract_text_values(data)
-
         # Combine JSON structure and extracted text
         if text_content:
             return f"JSON Structure:\n{json_str}\n\nExtracted Text Content:\n" + "\n".join(text_content)
@@ -445,8 +741,7 @@ class ContentProcessor:
 
     def _extract_from_text(self, file_path: Path) -> str:
         """Extract text from plain text file"""
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
+        return _read_text_file(file_path)
 
     def _extract_from_docx(self, file_path: Path) -> str:
         """Extract text from Word DOCX file"""
@@ -481,22 +776,21 @@ class ContentProcessor:
         try:
             import openpyxl
 
-            workbook = openpyxl.load_workbook(file_path)
+            # Read-only mode streams rows from the sheet XML instead of building the full cell model
+            workbook = openpyxl.load_workbook(file_path, read_only=True)
             text_content = []
 
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text_content.append(f"Sheet: {sheet_name}")
-
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = []
-                    for cell in row:
-                        if cell is not None:
-                            row_text.append(str(cell))
-                    if row_text:
-                        text_content.append(" | ".join(row_text))
-
-                text_content.append("")  # Empty line between sheets
+            try:
+                for sheet_name in workbook.sheetnames:
+                    text_content.append(f"Sheet: {sheet_name}")
+                    text_content.extend(
+                        " | ".join(str(cell) for cell in row if cell is not None)
+                        for row in workbook[sheet_name].iter_rows(values_only=True)
+                        if any(cell is not None for cell in row)
+                    )
+                    text_content.append("")  # Empty line between sheets
+            finally:
+                workbook.close()  # Read-only workbooks hold the archive open until closed
 
             return "\n".join(text_content)
 
@@ -577,47 +871,85 @@ class ContentProcessor:
         Returns:
             List of processing results for downloaded files
         """
-        results = []
-
         # Extract file URLs or paths from service result
-        file_references = self._extract_file_references(service_result)
-
-        for file_ref in file_references:
-            if file_ref.get("type") == "url":
-                result = self.process_url(file_ref["url"], query_context)
-                results.append(result)
-            elif file_ref.get("type") == "path":
-                # For local file paths, just process them
-                result = self.process_file(file_ref["path"], query_context)
-                results.append(result)
+        file_references = [
+            file_ref
+            for file_ref in self._extract_file_references(service_result)
+            if file_ref.get("type") in ("url", "path")
+        ]
+        if not file_references:
+            return []
 
-        return results
+        # Downloads are I/O bound, so process references concurrently; results keep reference order
+        with (
+            self._batched_metadata_saves() as batch,
+            ThreadPoolExecutor(max_workers=min(MAX_DOWNLOAD_WORKERS, len(file_references))) as executor,
+        ):
+            futures = [
+                executor.submit(self._in_metadata_batch, batch, self._process_file_reference, file_ref, query_context)
+                for file_ref in file_references
+            ]
+            return [future.result() for future in futures]
+
+    @contextlib.contextmanager
+    def _exclusive_path(self, path: Path):
+        """Hold a per-path lock so worker threads do not write the same workspace file at once"""
+        with self._state_lock:
+            lock = self._path_locks.setdefault(path, threading.Lock())
+        with lock:
+            yield
+
+    def _batched_metadata_saves(self, batch=None):
+        """Context that writes vector-store metadata merges once at the end of a batch
+
+        Pass the batch yielded by an outer block to join it from a worker thread.
+        """
+        if self.vector_store:
+            return self.vector_store.deferred_metadata_saves(batch)
+        return contextlib.nullcontext()
+
+    def _in_metadata_batch(self, batch, func, *args):
+        """Run func on a worker thread as part of a batch opened with _batched_metadata_saves"""
+        with self._batched_metadata_saves(batch):
+            return func(*args)
+
+    def _process_file_reference(self, file_ref: Dict[str, Any], query_context: str) -> Dict[str, Any]:
+        """Process a single reference from _extract_file_references"""
+        if file_ref["type"] == "url":
+            return self.process_url(file_ref["url"], query_context)
+        # For local file paths, just process them
+        return self.process_file(file_ref["path"], query_context)
 
     def _extract_file_references(self, service_result: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Extract file references from enterprise service results"""
-        file_refs = []
+        file_refs: List[Dict[str, Any]] = []
+        append = file_refs.append
 
         # Look for common patterns in service results
         if isinstance(service_result, dict):
             # Check for direct file URLs
-            if "url" in service_result and isinstance(service_result["url"], str):
-                file_refs.append({"type": "url", "url": service_result["url"]})
+            url = service_result.get("url")
+            if isinstance(url, str):
+                append({"type": "url", "url": url})
 
             # Check for file paths
             if "file_path" in service_result:
-                file_refs.append({"type": "path", "path": service_result["file_path"]})
+                append({"type": "path", "path": service_result["file_path"]})
 
             # Check for arrays of files
-            for key in ["files", "documents", "attachments", "results"]:
-                if key in service_result and isinstance(service_result[key], list):
-                    for item in service_result[key]:
-                        if isinstance(item, dict):
-                            if "url" in item:
-                                file_refs.append({"type": "url", "url": item["url"]})
-                            elif "path" in item:
-                                file_refs.append({"type": "path", "path": item["path"]})
-                            elif "file_path" in item:
-                                file_refs.append({"type": "path", "path": item["file_path"]})
+            for key in ("files", "documents", "attachments", "results"):
+                items = service_result.get(key)
+                if not isinstance(items, list):
+                    continue
+                for item in items:
+                    if not isinstance(item, dict):
+                        continue
+                    if "url" in item:
+                        append({"type": "url", "url": item["url"]})
+                    elif "path" in item:
+                        append({"type": "path", "path": item["path"]})
+                    elif "file_path" in item:
+                        append({"type": "path", "path": item["file_path"]})
 
         return file_refs
 
@@ -633,36 +965,41 @@ class ContentProcessor:
         Returns:
             List of content chunks
         """
-        if len(content) <= chunk_size:
+        content_length = len(content)
+        if content_length <= chunk_size:
             return [content]
 
         chunks = []
+        append = chunks.append
         start = 0
 
-        while start < len(content):
+        while start < content_length:
             end = start + chunk_size
 
             # Try to break at sentence or paragraph boundaries
-            if end < len(content):
+            if end < content_length:
+                # Candidate break positions are (lo, end]
+                lo = max(start + chunk_size // 2, end - 200) + 1
+
                 # Look for sentence endings
-                for i in range(end, max(start + chunk_size // 2, end - 200), -1):
-                    if content[i] in ".!?":
-                        end = i + 1
-                        break
+                sentence_end = max(
+                    content.rfind(".", lo, end + 1), content.rfind("!", lo, end + 1), content.rfind("?", lo, end + 1)
+                )
+                if sentence_end != -1:
+                    end = sentence_end + 1
                 # If no sentence break found, look for paragraph breaks
                 else:
-                    for i in range(end, max(start + chunk_size // 2, end - 200), -1):
-                        if content[i : i + 2] == "\n\n":
-                            end = i + 2
-                            break
+                    paragraph_break = content.rfind("\n\n", lo, end + 2)
+                    if paragraph_break != -1:
+                        end = paragraph_break + 2
 
             chunk = content[start:end].strip()
             if chunk:
-                chunks.append(chunk)
+                append(chunk)
 
             start = end - overlap
 
-            if start >= len(content):
+            if start >= content_length:
                 break
 
         return chunks
@@ -682,25 +1019,28 @@ class ContentProcessor:
             return []
 
         chunks = self.chunk_content(content)
-        doc_ids = []
-
-        for i, chunk in enumerate(chunks):
-            chunk_metadata = metadata.copy()
-            chunk_metadata.update({"chunk_index": i, "total_chunks": len(chunks), "is_chunk": True})
-
-            doc_id = self.vector_store.store_document(content=chunk, metadata=chunk_metadata)
-            doc_ids.append(doc_id)
-
-            # Add to cache if first chunk
-            if self.session_cache and i == 0:
-                self.session_cache.add_document(
-                    doc_id,
-                    content,  # Store full content reference
-                    source_type=metadata.get("source"),
-                    source_identifier=metadata.get("source_identifier"),
-                    file_path=metadata.get("file_path"),
-                    query_context=metadata.get("query_context"),
-                )
+        total_chunks = len(chunks)
+        documents = [
+            {
+                "content": chunk,
+                "metadata": {**metadata, "chunk_index": i, "total_chunks": total_chunks, "is_chunk": True},
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+
+        # One batched insert (and embeddings request) instead of one call per chunk
+        doc_ids = self.vector_store.batch_store_documents(documents, check_duplicates=True)
+
+        # Add to cache against the first chunk
+        if self.session_cache and doc_ids:
+            self.session_cache.add_document(
+                doc_ids[0],
+                content,  # Store full content reference
+                source_type=metadata.get("source"),
+                source_identifier=metadata.get("source_identifier"),
+                file_path=metadata.get("file_path"),
+                query_context=metadata.get("query_context"),
+            )
 
         return doc_ids
 
@@ -716,12 +1056,14 @@ class ContentProcessor:
             Dict containing extracted sources and metadata
         """
         # Limit content length for LLM processing
-        max_length = 8000
-        if len(content) > max_length:
-            # Take beginning and end to capture both intro citations and bibliography
-            content_sample = content[: max_length // 2] + "\n...\n" + content[-max_length // 2 :]
-        else:
-            content_sample = content
+        content_sample = self._sample_for_source_extraction(content)
+
+        # Identical samples (re-fetched or duplicated documents) reuse the earlier extraction
+        cache_key = hashlib.sha256(f"{self.model}\0{content_type}\0{content_sample}".encode("utf-8")).hexdigest()
+        with self._state_lock:
+            cached = self._source_extraction_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
 
         extraction_prompt = f"""
         Analyze the following {content_type} and extract all references to external sources, citations, and data sources.
@@ -760,26 +1102,67 @@ class ContentProcessor:
         try:
             response = prompt_llm(model=self.model, prompt=extraction_prompt)
 
-            if isinstance(response, dict):
-                return response
-            else:
+            if not isinstance(response, dict):
                 # Try to parse as JSON if string
                 import json
 
-                return json.loads(response)
+                response = json.loads(response)
+
+            if not isinstance(response, dict):
+                raise ValueError(f"Expected a JSON object, got {type(response).__name__}")
 
         except Exception as e:
             return {"sources": [], "statistics": [], "key_claims": [], "extraction_error": str(e)}
 
+        # Only successful extractions are cached, so failures are retried next time
+        with self._state_lock:
+            if len(self._source_extraction_cache) >= SOURCE_EXTRACTION_CACHE_SIZE:
+                self._source_extraction_cache.pop(next(iter(self._source_extraction_cache)))
+            self._source_extraction_cache[cache_key] = response
+        return dict(response)
+
+    def _sample_for_source_extraction(self, content: str) -> str:
+        """
+        Bound content to SOURCE_EXTRACTION_MAX_TOKENS for the extraction prompt
+
+        Long content keeps its beginning and end to capture both intro citations and bibliography.
+        """
+        half_budget = SOURCE_EXTRACTION_MAX_TOKENS // 2
+        # A token is rarely longer than 8 characters, so only the head and tail windows need encoding
+        window = half_budget * 8
+        encoding = _get_token_encoding(self.model)
+        if encoding is not None:
+            # Special-token text like <|endoftext|> in a document is encoded as ordinary text
+            if (
+                len(content) <= 2 * window
+                and len(encoding.encode(content, disallowed_special=())) <= SOURCE_EXTRACTION_MAX_TOKENS
+            ):
+                return content
+            head = encoding.decode(encoding.encode(content[:window], disallowed_special=())[:half_budget])
+            tail = encoding.decode(encoding.encode(content[-window:], disallowed_special=())[-half_budget:])
+        else:
+            max_length = 8000
+            if len(content) <= max_length:
+                return content
+            head, tail = content[: max_length // 2], content[-max_length // 2 :]
+
+        return head + "\n...\n" + tail
+
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about processed content"""
-        downloads_count = len(list(self.downloads_dir.glob("*"))) if self.downloads_dir.exists() else 0
-        extracted_count = len(list(self.extracted_dir.glob("*"))) if self.extracted_dir.exists() else 0
-
         return {
             "downloads_directory": str(self.downloads_dir),
             "extracted_directory": str(self.extracted_dir),
-            "downloaded_files": downloads_count,
-            "extracted_files": extracted_count,
+            "downloaded_files": self._count_entries(self.downloads_dir),
+            "extracted_files": self._count_entries(self.extracted_dir),
             "vector_store_connected": self.vector_store is not None,
         }
+
+    @staticmethod
+    def _count_entries(directory: Path) -> int:
+        """Count directory entries without building Path objects; a missing directory counts as empty"""
+        try:
+            with os.scandir(directory) as entries:
+                return sum(1 for _ in entries)
+        except FileNotFoundError:
+            return 0
@@ -1,7 +1,36 @@
-"""Enterprise service adapters"""
-from .nextcloud import NextcloudAdapter
-from .mattermost import MattermostAdapter
-from .filebrowser import FileBrowserAdapter
-from .email import EmailAdapter
+"""Enterprise service adapters
 
-__all__ = ["NextcloudAdapter", "MattermostAdapter", "FileBrowserAdapter", "EmailAdapter"]
\ No newline at end of file
+Adapters are imported on first access (PEP 562), so importing one adapter does not load the
+dependencies of the others, e.g. imaplib for EmailAdapter.
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .email import EmailAdapter
+    from .filebrowser import FileBrowserAdapter
+    from .mattermost import MattermostAdapter
+    from .nextcloud import NextcloudAdapter
+
+# Adapter class name -> submodule defining it
+_ADAPTER_MODULES = {
+    "NextcloudAdapter": "nextcloud",
+    "MattermostAdapter": "mattermost",
+    "FileBrowserAdapter": "filebrowser",
+    "EmailAdapter": "email",
+}
+
+__all__ = ["NextcloudAdapter", "MattermostAdapter", "FileBrowserAdapter", "EmailAdapter"]
+
+
+def __getattr__(name):
+    module_name = _ADAPTER_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    adapter = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = adapter
+    return adapter
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
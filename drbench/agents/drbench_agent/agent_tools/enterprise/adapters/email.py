@@ -12,12 +12,26 @@ Expects configuration from drbench enterprise space with structure:
 }
 """
 
+import atexit
+import binascii
 import email
+import functools
+import hashlib
 import imaplib
+import io
+import itertools
 import logging
+import os
+import quopri
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from email.header import decode_header
-from typing import Any, Dict, List, Optional
-from urllib.parse import urlparse
+from email.utils import decode_rfc2231
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
 
 import requests
 
@@ -25,12 +39,139 @@ from ..base import AuthMethod, BaseServiceAdapter, ServiceCapabilities
 
 logger = logging.getLogger(__name__)
 
+# Pooled connections idle longer than this are checked with NOOP before reuse
+IMAP_POOL_NOOP_AFTER = 60.0
+
+# Pooled connections idle longer than this are dropped; servers may auto-logout after 30 minutes
+IMAP_POOL_MAX_IDLE = 25 * 60.0
+
+# Idle connections kept per (host, port, username, password digest)
+IMAP_POOL_MAX_IDLE_PER_KEY = 4
+
+# Per-process key for credential digests, so shared caches never hold a plaintext password
+_CREDENTIAL_DIGEST_KEY = os.urandom(16)
+
+# How long discover_capabilities results are reused, after a successful and a failed login probe
+CAPABILITIES_CACHE_TTL = 600.0
+CAPABILITIES_FAILURE_CACHE_TTL = 60.0
+
+# Accounts probed concurrently by discover_many
+MAX_DISCOVERY_WORKERS = 16
+
+# Body bytes fetched for a 500-character preview (UTF-8 needs at most 4 bytes per character)
+_PREVIEW_BODY_BYTES = 2000
+
+# Tokens of a FETCH response: parentheses, quoted strings and atoms; an atom may carry a section
+# such as b"BODY[HEADER.FIELDS (SUBJECT)]", and a partial-fetch origin like b"<0>" is dropped
+_FETCH_TOKEN_RE = re.compile(
+    rb'\s*(?:(?P<open>\()|(?P<close>\))|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb"|(?P<atom>[^\s()\"\[]+(?:\[[^\]]*\])?)(?:<\d+>)?)"
+)
+
+# Backslash escape inside a quoted string
+_QUOTED_ESCAPE_RE = re.compile(rb"\\(.)")
+
+# Literal announcement ending a response line; imaplib returns the literal alongside the line
+_LITERAL_MARKER_RE = re.compile(rb"\{\d+\}$")
+
+# Characters that require an address display name to be quoted
+_ADDRESS_SPECIALS_RE = re.compile(r'[][\\()<>@,:;".]')
+
+# Bounds on BODYSTRUCTURE traversal, so a pathologically nested or wide message can't stall a listing
+MIME_MAX_DEPTH = 32
+ATTACHMENT_SCAN_MAX_PARTS = 64
+
+# Distinct (terms, text_search) combinations whose search criteria are kept
+SEARCH_CRITERIA_CACHE_SIZE = 256
+
+# Distinct encoded header values whose decoded form is kept
+DECODED_HEADER_CACHE_SIZE = 4096
+
+# HTML tags stripped from text/html bodies when there is no plain-text part
+_HTML_TAG_RE = re.compile("<[^<]+?>")
+
+# Capability list carried in a response code, e.g. b"[CAPABILITY IMAP4rev1 IDLE] Logged in"
+_CAPABILITY_CODE_RE = re.compile(rb"\[CAPABILITY ([^\]]*)\]", re.IGNORECASE)
+
+# Compressed bytes read from the socket at a time once COMPRESS=DEFLATE is active
+DEFLATE_READ_SIZE = 64 * 1024
+
+
+def _credential_digest(password: str) -> str:
+    """Keyed BLAKE2b digest of a password, for use in process-wide cache keys"""
+    return hashlib.blake2b(password.encode(), key=_CREDENTIAL_DIGEST_KEY, digest_size=16).hexdigest()
+
+
+class _InflatingReader(io.RawIOBase):
+    """Raw stream that inflates the server side of a COMPRESS=DEFLATE (RFC 4978) connection"""
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            data = self._inflater.unconsumed_tail or self._sock.recv(DEFLATE_READ_SIZE)
+            if not data:
+                return 0
+            inflated = self._inflater.decompress(data, len(buffer))
+            if inflated:
+                buffer[: len(inflated)] = inflated
+                return len(inflated)
+
+
+class _IMAP4(imaplib.IMAP4):
+    """imaplib.IMAP4 that refreshes capabilities after login and supports COMPRESS=DEFLATE"""
+
+    _deflater = None
+
+    def login(self, user, password):
+        typ, dat = super().login(user, password)
+        # Servers usually send their post-login capabilities in the response code; otherwise ask once
+        match = _CAPABILITY_CODE_RE.search(dat[-1] or b"")
+        if match:
+            capabilities = match.group(1)
+        else:
+            _, capability_data = self.capability()
+            capabilities = capability_data[-1]
+        self.capabilities = tuple(capabilities.decode().upper().split())
+        return typ, dat
+
+    def compress(self) -> bool:
+        """Switch the connection to DEFLATE compression in both directions"""
+        # imaplib only sends commands it knows the valid states for; registered here so merely
+        # importing the adapter leaves the stdlib command table alone
+        imaplib.Commands.setdefault("COMPRESS", ("AUTH", "SELECTED"))
+        typ, _ = self._simple_command("COMPRESS", "DEFLATE")
+        if typ != "OK":
+            return False
+        self._deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        plain_file, self.file = self.file, io.BufferedReader(_InflatingReader(self.sock), DEFLATE_READ_SIZE)
+        plain_file.close()
+        return True
+
+    def send(self, data):
+        if self._deflater is not None:
+            data = self._deflater.compress(data) + self._deflater.flush(zlib.Z_SYNC_FLUSH)
+        super().send(data)
+
 
 class EmailAdapter(BaseServiceAdapter):
     """Adapter for email service integration via IMAP"""
 
+    # Logged-in IMAP connections not currently checked out, shared by all adapters:
+    # (host, port, username, password digest) -> [(connection, last_used)]
+    _pool: Dict[Tuple[str, int, str, str], List[Tuple[imaplib.IMAP4, float]]] = {}
+    _pool_lock = threading.Lock()
+
+    # discover_capabilities results: (host, port, url, username, password digest) -> (expires_at, result)
+    _capabilities_cache: Dict[Tuple[str, int, str, str, str], Tuple[float, Dict[str, Any]]] = {}
+
     def __init__(self, config: Dict[str, Any], session: Optional[requests.Session] = None):
-        super().__init__("email_imap", config, session or requests.Session())
+        super().__init__("email_imap", config, session)
         self.auth_method = AuthMethod.BASIC
 
         # Extract IMAP host from URL and use the dynamically assigned port
@@ -49,6 +190,14 @@ class EmailAdapter(BaseServiceAdapter):
         self.imap_connection = None
         self.imap_credentials = None  # Will be set if authentication succeeds
 
+        # Match each term with a single TEXT key (headers and body); servers without an
+        # efficient TEXT search can set this False to search SUBJECT/FROM/BODY instead
+        self.text_search = config.get("text_search", True)
+
+        # Opt in (compress: True) to negotiate COMPRESS=DEFLATE on new connections when the
+        # server offers it; off by default since it swaps imaplib's socket I/O for our own
+        self.compress = config.get("compress", False)
+
     def discover_capabilities(self) -> Dict[str, Any]:
         """Discover email service capabilities and endpoints"""
         capabilities = []
@@ -78,6 +227,24 @@ class EmailAdapter(BaseServiceAdapter):
                 "error": "Invalid credentials in configuration",
             }
 
+        # Capabilities only depend on the server and credentials, so reuse a recent probe
+        cache_key = (self.imap_host, self.imap_port, self.base_url, username, _credential_digest(password))
+        cached = self._capabilities_cache.get(cache_key)
+        if cached and time.monotonic() >= cached[0]:
+            # Drop the expired entry rather than keeping it until it is overwritten
+            self._capabilities_cache.pop(cache_key, None)
+            cached = None
+        if cached:
+            result = cached[1]
+            if "error" in result:
+                return dict(result, capabilities=[], endpoints={}, credentials={})
+            self.imap_credentials = {"username": username, "password": password}
+            self.capabilities = list(result["capabilities"])
+            self.endpoints = dict(result["endpoints"])
+            return dict(
+                result, capabilities=self.capabilities, endpoints=self.endpoints, credentials={"username": username}
+            )
+
         logger.debug(f"Testing email credentials for user: {username}")
 
         # Test IMAP access with provided credentials
@@ -99,18 +266,21 @@ class EmailAdapter(BaseServiceAdapter):
             self.imap_credentials = {"username": username, "password": password}
         else:
             logger.error(f"Email service: Failed to authenticate with provided credentials")
-            return {
+            result = {
                 "capabilities": [],
                 "endpoints": {},
                 "auth_method": self.auth_method,
                 "credentials": {},
                 "error": "Authentication failed with provided credentials",
             }
+            # Cached briefly so repeated discovery doesn't hammer the server, while still recovering soon
+            self._capabilities_cache[cache_key] = (time.monotonic() + CAPABILITIES_FAILURE_CACHE_TTL, result)
+            return dict(result)
 
         self.capabilities = capabilities
         self.endpoints = endpoints
 
-        return {
+        result = {
             "capabilities": capabilities,
             "endpoints": endpoints,
             "auth_method": self.auth_method,
@@ -118,6 +288,11 @@ class EmailAdapter(BaseServiceAdapter):
             "imap_host": self.imap_host,
             "imap_port": self.imap_port,
         }
+        self._capabilities_cache[cache_key] = (
+            time.monotonic() + CAPABILITIES_CACHE_TTL,
+            dict(result, capabilities=list(capabilities), endpoints=dict(endpoints)),
+        )
+        return result
 
     def authenticate(self, credentials: Dict[str, Any]) -> bool:
         """Test authentication with provided credentials"""
@@ -134,40 +309,62 @@ class EmailAdapter(BaseServiceAdapter):
 
         return False
 
+    @classmethod
+    def discover_many(cls, configs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run discover_capabilities for several account configs concurrently
+
+        Each probe logs in over its own socket, so startup takes about as long as the slowest server
+        rather than the sum of all of them.
+
+        Returns:
+            Discovery results in the same order as configs
+        """
+        if not configs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(configs), MAX_DISCOVERY_WORKERS)) as executor:
+            return list(executor.map(lambda config: cls(config).discover_capabilities(), configs))
+
     def search(self, terms: List[str], context: Optional[Dict] = None) -> List[Dict[str, Any]]:
         """Search for emails matching the given terms"""
         results = []
 
+        # Blank terms would match every message; drop them before building criteria
+        terms = [term for term in terms if term and term.strip()]
+
+        # Build and check the criteria before touching the server, so malformed input costs no round trip
+        search_criteria = self._build_search_criteria(terms)
+        if not self._is_valid_search_criteria(search_criteria):
+            logger.error(f"Refusing malformed search criteria: {search_criteria}")
+            return results
+        logger.debug(f"Search criteria: {search_criteria}")
+
         try:
             # Connect to IMAP
             if not self._connect_imap():
                 logger.error("Failed to connect to IMAP server")
                 return results
 
-            # Search in INBOX
-            status, mailbox_info = self.imap_connection.select("INBOX")
+            # Search in INBOX (read-only: nothing is flagged or expunged)
+            status, mailbox_info = self._select_readonly("INBOX")
             if status != "OK":
                 logger.error(f"Failed to select INBOX: {mailbox_info}")
                 return results
             
             logger.debug(f"Selected INBOX, mailbox info: {mailbox_info}")
 
-            # Build search criteria
-            search_criteria = self._build_search_criteria(terms)
-            logger.debug(f"Search criteria: {search_criteria}")
-
             # Perform search
-            status, message_ids = self.imap_connection.search(None, search_criteria)
+            status, message_ids = self.imap_connection.uid("SEARCH", search_criteria)
             logger.debug(f"Search status: {status}, message_ids: {message_ids}")
             
-            # If complex search fails, try simpler fallback
-            if status != "OK" or not message_ids[0]:
+            # If the server rejects the search, try simpler fallback (an empty result is a valid answer)
+            if status != "OK":
                 logger.debug("Complex search failed, trying simpler fallback")
                 # Try a simple search for the first term only
                 if terms:
-                    simple_criteria = f'SUBJECT "{terms[0]}"'
+                    simple_criteria = f"SUBJECT {self._quote_imap_string(terms[0])}"
                     logger.debug(f"Fallback criteria: {simple_criteria}")
-                    status, message_ids = self.imap_connection.search(None, simple_criteria)
+                    status, message_ids = self.imap_connection.uid("SEARCH", simple_criteria)
                     logger.debug(f"Fallback search status: {status}, message_ids: {message_ids}")
 
             if status == "OK":
@@ -175,14 +372,8 @@ class EmailAdapter(BaseServiceAdapter):
                     msg_list = message_ids[0].split()
                     logger.debug(f"Found {len(msg_list)} messages")
                     
-                    # Fetch email details for matches (limit to last 20)
-                    for msg_id in msg_list[-20:]:
-                        try:
-                            email_data = self._fetch_email_details(msg_id)
-                            if email_data:
-                                results.append(email_data)
-                        except Exception as e:
-                            logger.debug(f"Error fetching email {msg_id}: {e}")
+                    # Fetch email details for matches (limit to last 20) in one round trip
+                    results.extend(self._fetch_email_details(msg_list[-20:]))
                 else:
                     logger.debug("No messages found matching search criteria")
             else:
@@ -190,8 +381,9 @@ class EmailAdapter(BaseServiceAdapter):
 
         except Exception as e:
             logger.error(f"Email search failed: {e}")
-        finally:
             self._disconnect_imap()
+        finally:
+            self._release_imap()
 
         return results
 
@@ -208,28 +400,23 @@ class EmailAdapter(BaseServiceAdapter):
             folder = "INBOX" if path == "/" else path.strip("/")
 
             # Select mailbox
-            status, response = self.imap_connection.select(folder)
+            status, response = self._select_readonly(folder)
             if status != "OK":
                 logger.error(f"Failed to select mailbox {folder}")
                 return results
 
             # Get list of all emails (limit to recent)
-            status, message_ids = self.imap_connection.search(None, "ALL")
+            status, message_ids = self.imap_connection.uid("SEARCH", "ALL")
 
             if status == "OK":
-                # Get last 50 emails
-                for msg_id in message_ids[0].split()[-50:]:
-                    try:
-                        email_data = self._fetch_email_summary(msg_id)
-                        if email_data:
-                            results.append(email_data)
-                    except Exception as e:
-                        logger.debug(f"Error fetching email {msg_id}: {e}")
+                # Get last 50 emails in one round trip
+                results.extend(self._fetch_email_summary(message_ids[0].split()[-50:]))
 
         except Exception as e:
             logger.error(f"Email listing failed: {e}")
-        finally:
             self._disconnect_imap()
+        finally:
+            self._release_imap()
 
         return results
 
@@ -248,10 +435,16 @@ class EmailAdapter(BaseServiceAdapter):
             if not self._connect_imap():
                 return {"success": False, "error": "Failed to connect to IMAP server"}
 
-            self.imap_connection.select(folder)
+            self._select_readonly(folder)
+
+            # Fetch just the requested attachment's MIME part when its structure allows
+            if len(parts) > 2:
+                attachment = self._download_attachment_part(msg_id, parts[2])
+                if attachment is not None:
+                    return attachment
 
             # Fetch the full email
-            status, data = self.imap_connection.fetch(msg_id, "(RFC822)")
+            status, data = self.imap_connection.uid("FETCH", msg_id, "(RFC822)")
 
             if status == "OK":
                 raw_email = data[0][1]
@@ -284,9 +477,10 @@ class EmailAdapter(BaseServiceAdapter):
 
         except Exception as e:
             logger.error(f"Email download failed: {e}")
+            self._disconnect_imap()
             return {"success": False, "error": str(e)}
         finally:
-            self._disconnect_imap()
+            self._release_imap()
 
         return {"success": False, "error": "Failed to download email"}
 
@@ -296,18 +490,96 @@ class EmailAdapter(BaseServiceAdapter):
         return response
 
     def _test_imap_access(self, username: str, password: str) -> bool:
-        """Test IMAP access with credentials"""
-        try:
-            imap = imaplib.IMAP4(self.imap_host, self.imap_port)
-            imap.login(username, password)
-            imap.logout()
+        """Test IMAP access with credentials, keeping the logged-in connection for later use"""
+        key = (self.imap_host, self.imap_port, username, _credential_digest(password))
+        imap = self._checkout_pooled(key)
+        if imap:
+            self._return_to_pool(key, imap)
             return True
+
+        try:
+            imap = self._login(username, password)
         except Exception as e:
             logger.debug(f"IMAP test failed for {username}: {e}")
             return False
 
+        self._return_to_pool(key, imap)
+        return True
+
+    def _login(self, username: str, password: str) -> imaplib.IMAP4:
+        """Open and log in a new connection; its capabilities stay cached on imap.capabilities"""
+        imap = _IMAP4(self.imap_host, self.imap_port)
+        try:
+            imap.login(username, password)
+            if self.compress and "COMPRESS=DEFLATE" in imap.capabilities:
+                imap.compress()
+        except Exception:
+            self._logout_quietly(imap)
+            raise
+        return imap
+
+    def _pool_key(self) -> Tuple[str, int, str, str]:
+        """Pool key for the validated credentials"""
+        return (
+            self.imap_host,
+            self.imap_port,
+            self.imap_credentials.get("username"),
+            _credential_digest(self.imap_credentials.get("password") or ""),
+        )
+
+    @classmethod
+    def _checkout_pooled(cls, key: Tuple[str, int, str, str]) -> Optional[imaplib.IMAP4]:
+        """Take a live idle connection for key out of the pool, or None if there is none"""
+        while True:
+            with cls._pool_lock:
+                idle = cls._pool.get(key)
+                if not idle:
+                    return None
+                imap, last_used = idle.pop()
+
+            idle_for = time.monotonic() - last_used
+            if idle_for > IMAP_POOL_MAX_IDLE:
+                cls._logout_quietly(imap)
+                continue
+            if idle_for > IMAP_POOL_NOOP_AFTER:
+                try:
+                    status, _ = imap.noop()
+                except (imaplib.IMAP4.abort, imaplib.IMAP4.error, OSError):
+                    status = None
+                if status != "OK":
+                    cls._logout_quietly(imap)
+                    continue
+            return imap
+
+    @classmethod
+    def _return_to_pool(cls, key: Tuple[str, int, str, str], imap: imaplib.IMAP4):
+        """Put a healthy logged-in connection back into the pool for reuse"""
+        with cls._pool_lock:
+            idle = cls._pool.setdefault(key, [])
+            if len(idle) < IMAP_POOL_MAX_IDLE_PER_KEY:
+                idle.append((imap, time.monotonic()))
+                return
+        cls._logout_quietly(imap)
+
+    @classmethod
+    def close_pooled_connections(cls):
+        """Log out every idle pooled connection"""
+        with cls._pool_lock:
+            idle = [imap for entries in cls._pool.values() for imap, _ in entries]
+            cls._pool.clear()
+        for imap in idle:
+            cls._logout_quietly(imap)
+
+    @staticmethod
+    def _logout_quietly(imap: imaplib.IMAP4):
+        """Log out a connection, ignoring errors from an already dead socket"""
+        try:
+            imap.logout()
+        except Exception:
+            pass
+
     def _connect_imap(self) -> bool:
-        """Establish IMAP connection"""
+        """Check out a pooled IMAP connection, or establish a new one"""
         if self.imap_connection:
             return True
 
@@ -315,206 +587,483 @@ class EmailAdapter(BaseServiceAdapter):
             logger.error("Cannot connect to IMAP: No valid credentials available")
             return False
 
+        self.imap_connection = self._checkout_pooled(self._pool_key())
+        if self.imap_connection:
+            return True
+
         try:
-            self.imap_connection = imaplib.IMAP4(self.imap_host, self.imap_port)
-            username = self.imap_credentials.get("username")
-            password = self.imap_credentials.get("password")
-            self.imap_connection.login(username, password)
+            self.imap_connection = self._login(
+                self.imap_credentials.get("username"), self.imap_credentials.get("password")
+            )
             return True
         except Exception as e:
             logger.error(f"IMAP connection failed: {e}")
             self.imap_connection = None
             return False
 
+    def _select_readonly(self, mailbox: str) -> Tuple[str, List[Any]]:
+        """
+        Select mailbox read-only, skipping the SELECT round trip when this connection already has it open
+
+        Pooled connections keep their mailbox selected, so repeated calls on the same folder go straight
+        to SEARCH/FETCH; the server still reports new and expunged messages on those commands.
+        """
+        imap = self.imap_connection
+        if imap.state == "SELECTED" and imap.is_readonly and getattr(imap, "_selected_mailbox", None) == mailbox:
+            return "OK", []
+
+        status, data = imap.select(mailbox, readonly=True)
+        # imaplib drops back to the authenticated state when SELECT fails
+        imap._selected_mailbox = mailbox if status == "OK" else None
+        return status, data
+
+    def _release_imap(self):
+        """
+        Return the IMAP connection to the pool so the next call skips connect and login
+
+        The mailbox stays selected; the next SELECT/EXAMINE replaces it without a CLOSE round trip.
+        """
+        if self.imap_connection:
+            self._return_to_pool(self._pool_key(), self.imap_connection)
+            self.imap_connection = None
+
     def _disconnect_imap(self):
-        """Close IMAP connection"""
+        """Close IMAP connection (used when it may be in a broken state)"""
         if self.imap_connection:
-            try:
-                self.imap_connection.close()
-                self.imap_connection.logout()
-            except:
-                pass
+            # No CLOSE first: mailboxes are opened read-only and LOGOUT releases them without an EXPUNGE
+            self._logout_quietly(self.imap_connection)
             self.imap_connection = None
 
+    @staticmethod
+    def _quote_imap_string(value: str) -> str:
+        """Quote a value as an IMAP quoted string, escaping backslashes and double quotes"""
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    @staticmethod
+    def _is_valid_search_criteria(criteria: str) -> bool:
+        """Check that criteria are non-empty with closed quoted strings and balanced parentheses"""
+        depth = 0
+        in_quotes = False
+        escaped = False
+        for char in criteria:
+            if in_quotes:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_quotes = False
+            elif char == '"':
+                in_quotes = True
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth < 0:
+                    return False
+        return bool(criteria.strip()) and depth == 0 and not in_quotes
+
     def _build_search_criteria(self, terms: List[str]) -> str:
-        """Build IMAP search criteria from search terms"""
-        if not terms:
-            return "ALL"
-
-        # For single term, search in subject, from, and body with OR
-        if len(terms) == 1:
-            term = terms[0]
-            # IMAP OR takes exactly 2 arguments, so we need to nest them
-            return f'OR OR SUBJECT "{term}" FROM "{term}" BODY "{term}"'
-        
-        # For multiple terms, search for any term in any field
-        # Build a complex OR structure
-        all_criteria = []
-        for term in terms:
-            # For each term, create OR of subject/from/body
-            term_criteria = f'OR OR SUBJECT "{term}" FROM "{term}" BODY "{term}"'
-            all_criteria.append(term_criteria)
-        
-        # Join multiple terms with OR (each term_criteria is one argument)
-        if len(all_criteria) == 1:
-            return all_criteria[0]
-        elif len(all_criteria) == 2:
-            return f'OR ({all_criteria[0]}) ({all_criteria[1]})'
-        else:
-            # For more than 2 terms, nest OR operations
-            result = all_criteria[0]
-            for criteria in all_criteria[1:]:
-                result = f'OR ({result}) ({criteria})'
-            return result
-
-    def _fetch_email_details(self, msg_id: bytes) -> Optional[Dict[str, Any]]:
-        """Fetch detailed information about an email"""
+        """Build IMAP search criteria matching messages that contain any of the terms"""
+        return _search_criteria(tuple(terms), self.text_search)
+
+    def _fetch_messages(self, msg_ids: List[bytes], message_parts: str) -> Dict[bytes, Dict[str, Any]]:
+        """
+        UID FETCH message_parts for all msg_ids (UIDs) with a single command
+
+        Returns:
+            Dict of UID -> {item name (e.g. "ENVELOPE", "BODY[TEXT]"): parsed value}, where
+            parenthesized lists become Python lists, strings and atoms bytes, and NIL None
+        """
+        if not msg_ids:
+            return {}
+
+        status, data = self.imap_connection.uid("FETCH", b",".join(msg_ids), message_parts)
+        if status != "OK":
+            logger.debug(f"Batch fetch failed with status: {status}")
+            return {}
+
+        # imaplib returns a (line, literal) tuple per literal and plain bytes for text between and after
+        # literals; reading them in order gives "<id> (<name> <value> ...) <id> (...)"
+        stack: List[List[Any]] = [[]]
+        for entry in data:
+            line, literal = entry if isinstance(entry, tuple) else (entry, None)
+            if not isinstance(line, bytes):
+                continue
+            if literal is not None:
+                line = _LITERAL_MARKER_RE.sub(b"", line)
+            for token in _FETCH_TOKEN_RE.finditer(line):
+                if token.group("open"):
+                    stack.append([])
+                elif token.group("close"):
+                    if len(stack) > 1:
+                        closed = stack.pop()
+                        stack[-1].append(closed)
+                elif token.group("quoted") is not None:
+                    stack[-1].append(_QUOTED_ESCAPE_RE.sub(rb"\1", token.group("quoted")))
+                else:
+                    atom = token.group("atom")
+                    stack[-1].append(None if atom.upper() == b"NIL" else atom)
+            if literal is not None:
+                stack[-1].append(literal)
+
+        by_sequence: Dict[bytes, Dict[str, Any]] = {}
+        responses = stack[0]
+        for number, items in zip(responses, responses[1:]):
+            if isinstance(number, bytes) and number.isdigit() and isinstance(items, list):
+                fields = by_sequence.setdefault(number, {})
+                for name, value in zip(items[::2], items[1::2]):
+                    if isinstance(name, bytes):
+                        fields[name.decode().upper()] = value
+
+        # Responses are numbered by sequence number; UID FETCH adds the UID item, while unsolicited
+        # flag updates for other messages lack it and are dropped
+        return {fields["UID"]: fields for fields in by_sequence.values() if isinstance(fields.get("UID"), bytes)}
+
+    @staticmethod
+    def _envelope_string(value: Optional[bytes]) -> str:
+        """Decode an ENVELOPE string field (NIL becomes an empty string)"""
+        return value.decode("utf-8", errors="replace") if value else ""
+
+    def _format_addresses(self, addresses: Optional[List[Any]]) -> str:
+        """Format an ENVELOPE address list as "Name <mailbox@host>, ..." """
+        formatted = []
+        for address in addresses or []:
+            if not isinstance(address, list) or len(address) < 4:
+                continue
+            name, _route, mailbox, host = address[:4]
+            # Group start and end markers have no host
+            if mailbox is None or host is None:
+                continue
+            addr = f"{self._envelope_string(mailbox)}@{self._envelope_string(host)}"
+            display_name = self._decode_header(self._envelope_string(name))
+            if not display_name:
+                formatted.append(addr)
+                continue
+            if _ADDRESS_SPECIALS_RE.search(display_name):
+                display_name = self._quote_imap_string(display_name)
+            formatted.append(f"{display_name} <{addr}>")
+        return ", ".join(formatted)
+
+    def _fetch_email_details(self, msg_ids: List[bytes]) -> List[Dict[str, Any]]:
+        """Fetch detailed information about emails"""
         try:
-            # Fetch email headers and structure
-            status, data = self.imap_connection.fetch(msg_id, "(RFC822.HEADER BODY[TEXT])")
-
-            if status == "OK":
-                header_data = data[0][1]
-                body_data = data[1][1] if len(data) > 1 else b""
+            # The server parses headers and MIME structure for us; PEEK leaves the \\Seen flag alone
+            messages = self._fetch_messages(
+                msg_ids, f"(ENVELOPE BODYSTRUCTURE BODY.PEEK[TEXT]<0.{_PREVIEW_BODY_BYTES}>)"
+            )
+        except Exception as e:
+            logger.debug(f"Error fetching email details: {e}")
+            return []
 
-                msg = email.message_from_bytes(header_data)
+        results = []
+        for msg_id in msg_ids:
+            try:
+                items = messages.get(msg_id) or {}
+                envelope = items.get("ENVELOPE")
+                if not isinstance(envelope, list):
+                    continue
 
-                # Decode subject
-                subject = self._decode_header(msg.get("Subject", ""))
-                from_addr = self._decode_header(msg.get("From", ""))
-                to_addr = self._decode_header(msg.get("To", ""))
-                date_str = msg.get("Date", "")
+                # ENVELOPE is (date subject from sender reply-to to cc bcc in-reply-to message-id)
+                date, subject, from_addrs, _sender, _reply_to, to_addrs = envelope[:6]
+                body_data = items.get("BODY[TEXT]") or b""
 
-                # Try to decode body
+                # Try to decode body (first 500 chars); never more than the preview's bytes, even if the
+                # server ignored the partial fetch and sent the whole text
                 try:
-                    body_text = body_data.decode("utf-8", errors="ignore")[:500]  # First 500 chars
+                    body_text = body_data[:_PREVIEW_BODY_BYTES].decode("utf-8", errors="ignore")[:500]
                 except:
                     body_text = "Unable to decode body"
 
-                return {
-                    "id": msg_id.decode(),
-                    "type": "email",
-                    "subject": subject,
-                    "from": from_addr,
-                    "to": to_addr,
-                    "date": date_str,
-                    "preview": body_text,
-                    "path": f"INBOX/{msg_id.decode()}",
-                    "has_attachments": self._has_attachments(msg),
-                }
-
-        except Exception as e:
-            logger.debug(f"Error fetching email details: {e}")
-            return None
+                results.append(
+                    {
+                        "id": msg_id.decode(),
+                        "type": "email",
+                        "subject": self._decode_header(self._envelope_string(subject)),
+                        "from": self._format_addresses(from_addrs),
+                        "to": self._format_addresses(to_addrs),
+                        "date": self._envelope_string(date),
+                        "preview": body_text,
+                        "path": f"INBOX/{msg_id.decode()}",
+                        "has_attachments": self._has_attachments(items.get("BODYSTRUCTURE")),
+                    }
+                )
 
-    def _fetch_email_summary(self, msg_id: bytes) -> Optional[Dict[str, Any]]:
-        """Fetch summary information about an email"""
-        try:
-            # Fetch only headers for summary
-            status, data = self.imap_connection.fetch(msg_id, "(RFC822.HEADER)")
+            except Exception as e:
+                logger.debug(f"Error fetching email {msg_id}: {e}")
 
-            if status == "OK":
-                header_data = data[0][1]
-                msg = email.message_from_bytes(header_data)
-
-                # Decode headers
-                subject = self._decode_header(msg.get("Subject", ""))
-                from_addr = self._decode_header(msg.get("From", ""))
-                date_str = msg.get("Date", "")
-
-                return {
-                    "id": msg_id.decode(),
-                    "name": subject,
-                    "type": "email",
-                    "from": from_addr,
-                    "date": date_str,
-                    "path": f"INBOX/{msg_id.decode()}",
-                    "size": len(header_data),
-                }
+        return results
 
+    def _fetch_email_summary(self, msg_ids: List[bytes]) -> List[Dict[str, Any]]:
+        """Fetch summary information about emails"""
+        try:
+            # The server-parsed envelope carries every header shown in the summary
+            messages = self._fetch_messages(msg_ids, "(RFC822.SIZE ENVELOPE)")
         except Exception as e:
             logger.debug(f"Error fetching email summary: {e}")
-            return None
+            return []
+
+        results = []
+        for msg_id in msg_ids:
+            try:
+                items = messages.get(msg_id) or {}
+                envelope = items.get("ENVELOPE")
+                if not isinstance(envelope, list):
+                    continue
+
+                date, subject, from_addrs = envelope[:3]
+
+                results.append(
+                    {
+                        "id": msg_id.decode(),
+                        "name": self._decode_header(self._envelope_string(subject)),
+                        "type": "email",
+                        "from": self._format_addresses(from_addrs),
+                        "date": self._envelope_string(date),
+                        "path": f"INBOX/{msg_id.decode()}",
+                        "size": int(items.get("RFC822.SIZE") or 0),
+                    }
+                )
+
+            except Exception as e:
+                logger.debug(f"Error fetching email {msg_id}: {e}")
+
+        return results
 
     def _decode_header(self, header_value: str) -> str:
         """Decode email header value"""
         if not header_value:
             return ""
-
-        decoded_parts = []
-        for part, encoding in decode_header(header_value):
-            if isinstance(part, bytes):
-                try:
-                    decoded_parts.append(part.decode(encoding or "utf-8", errors="ignore"))
-                except:
-                    decoded_parts.append(str(part))
-            else:
-                decoded_parts.append(str(part))
-
-        return " ".join(decoded_parts)
+        # Raw 8-bit headers come back as email.header.Header objects, which aren't worth caching
+        if not isinstance(header_value, str):
+            return _decode_encoded_header.__wrapped__(header_value)
+        # Without an encoded word decode_header would return the value unchanged
+        if "=?" not in header_value:
+            return header_value
+        return _decode_encoded_header(header_value)
 
     def _extract_email_content(self, msg: email.message.Message) -> str:
         """Extract readable content from email message"""
-        content_parts = []
-
-        # Add headers
-        content_parts.append(f"Subject: {self._decode_header(msg.get('Subject', ''))}")
-        content_parts.append(f"From: {self._decode_header(msg.get('From', ''))}")
-        content_parts.append(f"To: {self._decode_header(msg.get('To', ''))}")
-        content_parts.append(f"Date: {msg.get('Date', '')}")
-        content_parts.append("\n---\n")
-
-        # Extract body
+        headers = [
+            f"Subject: {self._decode_header(msg.get('Subject', ''))}",
+            f"From: {self._decode_header(msg.get('From', ''))}",
+            f"To: {self._decode_header(msg.get('To', ''))}",
+            f"Date: {msg.get('Date', '')}",
+            "\n---\n",
+        ]
+
+        # Extract body and attachment names
+        attachments = []
         if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                if content_type == "text/plain":
-                    try:
-                        body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-                        content_parts.append(body)
-                    except:
-                        pass
-                elif content_type == "text/html" and len(content_parts) == 5:  # Only if no plain text
-                    try:
-                        html_body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-                        # Simple HTML stripping
-                        import re
-
-                        text_body = re.sub("<[^<]+?>", "", html_body)
-                        content_parts.append(text_body)
-                    except:
-                        pass
+            plain_parts, html_parts, attachments = self._scan_parts(msg)
+            # HTML only if there is no plain text
+            bodies = plain_parts or html_parts
         else:
             try:
-                body = msg.get_payload(decode=True).decode("utf-8", errors="ignore")
-                content_parts.append(body)
+                bodies = [msg.get_payload(decode=True).decode("utf-8", errors="ignore")]
             except:
-                content_parts.append("Unable to decode email body")
+                bodies = ["Unable to decode email body"]
 
         # List attachments
-        attachments = self._list_attachments(msg)
-        if attachments:
-            content_parts.append("\n---\nAttachments:")
-            for att in attachments:
-                content_parts.append(f"- {att}")
+        attachment_lines = ["\n---\nAttachments:", *(f"- {att}" for att in attachments)] if attachments else []
 
-        return "\n".join(content_parts)
+        return "\n".join(headers + bodies + attachment_lines)
 
-    def _has_attachments(self, msg: email.message.Message) -> bool:
-        """Check if email has attachments"""
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_disposition() == "attachment":
-                    return True
-        return False
+    def _has_attachments(self, structure: Any) -> bool:
+        """Check a multipart message's BODYSTRUCTURE for a part with an attachment disposition"""
+        if not isinstance(structure, list) or not structure or not isinstance(structure[0], list):
+            return False
+        # any() stops at the first attachment; parts beyond the cap are not inspected
+        parts = itertools.islice(self._iter_body_parts(structure), ATTACHMENT_SCAN_MAX_PARTS)
+        return any(self._part_disposition(part)[0] == "attachment" for _, part in parts)
+
+    def _iter_body_parts(self, structure: List[Any], number: str = "") -> Iterator[Tuple[str, List[Any]]]:
+        """
+        Yield (part number, single-part BODYSTRUCTURE) in the order email's walk() visits them
+
+        Part numbers are the section specifiers for BODY[...], e.g. "2" or "1.3". Parts nested
+        deeper than MIME_MAX_DEPTH are skipped.
+        """
+        if number.count(".") >= MIME_MAX_DEPTH:
+            return
+
+        if isinstance(structure[0], list):
+            # Multipart: child parts come first, followed by the subtype and extension data
+            for index, child in enumerate(structure, 1):
+                if not isinstance(child, list) or not child:
+                    break
+                yield from self._iter_body_parts(child, f"{number}.{index}" if number else str(index))
+            return
+
+        yield number or "1", structure
+
+        # An attached message's own parts are numbered under it
+        if self._media_type(structure) == "message/rfc822" and len(structure) > 8:
+            body = structure[8]
+            if isinstance(body, list) and body:
+                yield from self._iter_body_parts(body, number if isinstance(body[0], list) else f"{number}.1")
+
+    @staticmethod
+    def _media_type(part: List[Any]) -> str:
+        """Lower-case "type/subtype" of a single-part BODYSTRUCTURE"""
+        media_type = part[0] if isinstance(part[0], bytes) else b"text"
+        subtype = part[1] if len(part) > 1 and isinstance(part[1], bytes) else b"plain"
+        return f"{media_type.decode()}/{subtype.decode()}".lower()
+
+    @staticmethod
+    def _structure_param(params: Any, name: str) -> Optional[str]:
+        """Look up a BODYSTRUCTURE parameter, decoding an RFC 2231 extended value (name*)"""
+        if not isinstance(params, list):
+            return None
+        for key, value in zip(params[::2], params[1::2]):
+            if not isinstance(key, bytes) or not isinstance(value, bytes):
+                continue
+            key = key.decode(errors="replace").lower()
+            if key == name:
+                return value.decode("utf-8", errors="replace")
+            if key == f"{name}*":
+                # charset'language'percent-encoded-text
+                charset, _language, text = decode_rfc2231(value.decode("utf-8", errors="replace"))
+                try:
+                    return unquote(text, encoding=charset or "us-ascii", errors="replace")
+                except LookupError:
+                    return unquote(text, errors="replace")
+        return None
+
+    def _part_disposition(self, part: List[Any]) -> Tuple[Optional[str], Optional[str]]:
+        """Return the (disposition, filename) of a single-part BODYSTRUCTURE"""
+        # type, subtype, params, id, description, encoding, size, then type-specific fields
+        # (text: line count; message/rfc822: envelope, body, line count), md5 and disposition
+        media_type = self._media_type(part)
+        if media_type.startswith("text/"):
+            disposition_index = 9
+        elif media_type == "message/rfc822":
+            disposition_index = 11
+        else:
+            disposition_index = 8
+        disposition = part[disposition_index] if len(part) > disposition_index else None
+
+        # Disposition is ("attachment" (params)); some servers send the raw header value instead
+        if isinstance(disposition, list) and disposition and isinstance(disposition[0], bytes):
+            disposition_type = disposition[0].decode(errors="replace").lower()
+            filename = self._structure_param(disposition[1] if len(disposition) > 1 else None, "filename")
+        elif isinstance(disposition, bytes):
+            header = email.message.Message()
+            header["Content-Disposition"] = disposition.decode("utf-8", errors="replace")
+            disposition_type = header.get_content_disposition()
+            filename = header.get_filename()
+        else:
+            return None, None
+
+        # Like Message.get_filename(), fall back to the Content-Type name parameter
+        return disposition_type, filename or self._structure_param(part[2] if len(part) > 2 else None, "name")
+
+    def _download_attachment_part(self, msg_id: str, attachment_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Download one attachment by fetching BODYSTRUCTURE and then only that MIME part
+
+        Returns None when the part can't be located or decoded this way, so the caller falls
+        back to fetching the full message.
+        """
+        key = msg_id.encode()
+        structure = self._fetch_messages([key], "(BODYSTRUCTURE)").get(key, {}).get("BODYSTRUCTURE")
+        if not isinstance(structure, list) or not structure:
+            return None
+
+        for number, part in self._iter_body_parts(structure):
+            if self._part_disposition(part) != ("attachment", attachment_name):
+                continue
+
+            encoding = part[5].decode(errors="replace").lower() if len(part) > 5 and part[5] else "7bit"
+            if encoding not in ("7bit", "8bit", "binary", "base64", "quoted-printable"):
+                return None
 
-    def _list_attachments(self, msg: email.message.Message) -> List[str]:
-        """List attachment filenames"""
+            data = self._fetch_messages([key], f"(BODY.PEEK[{number}])").get(key, {}).get(f"BODY[{number}]")
+            if data is None:
+                return None
+            try:
+                if encoding == "base64":
+                    data = binascii.a2b_base64(data)
+                elif encoding == "quoted-printable":
+                    data = quopri.decodestring(data)
+            except binascii.Error:
+                return None
+
+            return {
+                "success": True,
+                "content": data,
+                "filename": attachment_name,
+                "content_type": self._media_type(part),
+            }
+
+        return None
+
+    def _scan_parts(self, msg: email.message.Message) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Walk a multipart message once, collecting body texts and attachment filenames
+
+        Returns:
+            (texts of text/plain parts, tag-stripped text of the first text/html part, attachment filenames)
+        """
+        plain_parts = []
+        html_parts = []
         attachments = []
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_disposition() == "attachment":
-                    filename = part.get_filename()
-                    if filename:
-                        attachments.append(filename)
-        return attachments
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            if content_type == "text/plain":
+                try:
+                    plain_parts.append(part.get_payload(decode=True).decode("utf-8", errors="ignore"))
+                except:
+                    pass
+            elif content_type == "text/html" and not html_parts:
+                try:
+                    html_body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
+                    # Simple HTML stripping
+                    html_parts.append(_HTML_TAG_RE.sub("", html_body))
+                except:
+                    pass
+
+            if part.get_content_disposition() == "attachment":
+                filename = part.get_filename()
+                if filename:
+                    attachments.append(filename)
+
+        return plain_parts, html_parts, attachments
+
+
+@functools.lru_cache(maxsize=SEARCH_CRITERIA_CACHE_SIZE)
+def _search_criteria(terms: Tuple[str, ...], text_search: bool) -> str:
+    """Build IMAP search criteria for terms; refined searches repeat the same term lists"""
+    if not terms:
+        return "ALL"
+
+    keys = []
+    for term in terms:
+        quoted = EmailAdapter._quote_imap_string(term)
+        if text_search:
+            keys.append(f"TEXT {quoted}")
+        else:
+            # IMAP OR takes exactly 2 search keys, so three fields need two ORs
+            keys.append(f"OR OR SUBJECT {quoted} FROM {quoted} BODY {quoted}")
+
+    # OR is a prefix operator, so "OR OR a b c" matches any of a, b, c without nesting parentheses
+    return " ".join(["OR"] * (len(keys) - 1) + keys)
+
+
+@functools.lru_cache(maxsize=DECODED_HEADER_CACHE_SIZE)
+def _decode_encoded_header(header_value: str) -> str:
+    """Decode a header value containing RFC 2047 encoded words; senders and subjects repeat across a mailbox"""
+    decoded_parts = []
+    for part, encoding in decode_header(header_value):
+        if isinstance(part, bytes):
+            try:
+                decoded_parts.append(part.decode(encoding or "utf-8", errors="ignore"))
+            except:
+                decoded_parts.append(str(part))
+        else:
+            decoded_parts.append(str(part))
+
+    return " ".join(decoded_parts)
+
+
+atexit.register(EmailAdapter.close_pooled_connections)
@@ -1,21 +1,71 @@
 """FileBrowser service adapter implementation"""
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import posixpath
+import re
+import shutil
+import threading
+import time
+from collections import defaultdict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import quote
 import requests
+import urllib3
 
-from ..base import BaseServiceAdapter, ServiceCapabilities, AuthMethod
+from ..base import (
+    BaseServiceAdapter,
+    ServiceCapabilities,
+    AuthMethod,
+    JSON_HEADERS,
+    encode_json_body,
+    parse_json_response
+)
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on directory listings fetched concurrently while crawling
+MAX_LISTING_WORKERS = 16
+
+# Maximum number of files returned by search
+MAX_SEARCH_RESULTS = 20
+
+# Buffer size used when copying downloads straight to disk
+DOWNLOAD_COPY_BUFFER_SIZE = 1024 * 1024
+
+# Default seconds a directory listing is reused (override with config["cache_ttl"], 0 disables)
+LISTING_CACHE_TTL = 60
+
+# Seconds a login token is reused; FileBrowser issues tokens valid for 2 hours by default
+TOKEN_REUSE_TTL = 2 * 60 * 60 - 5 * 60
+
 
 class FileBrowserAdapter(BaseServiceAdapter):
     """Adapter for FileBrowser REST API integration"""
     
     def __init__(self, config: Dict[str, Any], session: Optional[requests.Session] = None):
-        super().__init__("filebrowser", config, session or requests.Session())
+        super().__init__("filebrowser", config, session)
         self.auth_method = AuthMethod.CUSTOM  # Uses X-Auth header
         self.api_base = f"{self.base_url}/api"
+        # Cleared once the server turns out not to provide /api/search/
+        self._search_endpoint_available = True
+        self.cache_ttl = config.get("cache_ttl", LISTING_CACHE_TTL)
+        # Directory listings by API path, as (expires_at, etag, items); stale entries
+        # with an ETag are revalidated with a conditional GET
+        self._listing_cache: Dict[str, Tuple[float, Optional[str], List[Dict[str, Any]]]] = {}
+        self._token_expires_at = 0.0
+        # Listings are fetched from worker threads; guards the listing cache and token expiry
+        # (logins are serialized separately)
+        self._state_lock = threading.Lock()
+        self._login_lock = threading.Lock()
+        # Set once a listing succeeds; until then a refused listing withdraws the file capabilities
+        self._file_access_confirmed = False
+        # Crawled files for fallback search, as (expires_at, files, lowercased names,
+        # trigram -> positions in files); kept for the listing cache TTL
+        self._file_index: Optional[
+            Tuple[float, List[Dict[str, Any]], List[str], Dict[str, Set[int]]]
+        ] = None
         
     def discover_capabilities(self) -> Dict[str, Any]:
         """Discover FileBrowser capabilities and endpoints"""
@@ -27,7 +77,8 @@ class FileBrowserAdapter(BaseServiceAdapter):
         username = credentials.get("username") or self.config.get("username", "admin")
         password = credentials.get("password") or self.config.get("password", "admin")
         
-        # Try to login and test access
+        # Try to login; FileBrowser users can read their scope by default, so file
+        # access is assumed here and confirmed by the first listing
         token = self._login(username, password)
         if token:
             working_credentials = {
@@ -36,22 +87,20 @@ class FileBrowserAdapter(BaseServiceAdapter):
                 "token": token
             }
             
-            # Test file listing to confirm access
-            if self._test_file_access(token):
-                capabilities.extend([
-                    ServiceCapabilities.FILE_LISTING,
-                    ServiceCapabilities.FILE_DOWNLOAD,
-                    ServiceCapabilities.FILE_SEARCH,
-                    ServiceCapabilities.FILE_UPLOAD
-                ])
-                
-                endpoints.update({
-                    "list_files": f"{self.api_base}/resources/",
-                    "download_file": f"{self.api_base}/raw/",
-                    "search_files": f"{self.api_base}/search/",
-                    "upload_file": f"{self.api_base}/resources/"
-                })
-                
+            capabilities.extend([
+                ServiceCapabilities.FILE_LISTING,
+                ServiceCapabilities.FILE_DOWNLOAD,
+                ServiceCapabilities.FILE_SEARCH,
+                ServiceCapabilities.FILE_UPLOAD
+            ])
+            
+            endpoints.update({
+                "list_files": f"{self.api_base}/resources/",
+                "download_file": f"{self.api_base}/raw/",
+                "search_files": f"{self.api_base}/search/",
+                "upload_file": f"{self.api_base}/resources/"
+            })
+            
         self.capabilities = capabilities
         self.endpoints = endpoints
         self.credentials = working_credentials or {"username": username, "password": password}
@@ -88,18 +137,30 @@ class FileBrowserAdapter(BaseServiceAdapter):
         if not self.credentials.get("token"):
             return []
             
-        # FileBrowser doesn't have a dedicated search API,
-        # so we'll list files and filter
-        all_files = self._list_all_files()
-        
-        matching_files = []
-        for file_info in all_files:
-            file_name = file_info.get("name", "").lower()
-            if any(term.lower() in file_name for term in terms):
-                file_info["relevance_reason"] = f"Filename matches: {terms}"
-                matching_files.append(file_info)
-                
-        return matching_files[:20]  # Limit results
+        if not terms:
+            return []
+            
+        # Both search paths match a file when its lowercased name contains any whole term
+        term_pattern = re.compile("|".join(re.escape(term.lower()) for term in terms))
+        matching_files = self._search_on_server(terms, term_pattern)
+        if matching_files is None:
+            # No server-side search, so filter the crawled files
+            files, names, trigram_index = self._indexed_files()
+            matching_files = [
+                dict(files[position]) for position in islice(
+                    (
+                        position for position in self._trigram_candidates(terms, names, trigram_index)
+                        if term_pattern.search(names[position])
+                    ),
+                    MAX_SEARCH_RESULTS
+                )
+            ]
+            
+        matching_files = matching_files[:MAX_SEARCH_RESULTS]
+        for file_info in matching_files:
+            file_info["relevance_reason"] = f"Filename matches: {terms}"
+            
+        return matching_files
     
     def list_files(self, path: str = "/") -> List[Dict[str, Any]]:
         """List files at the given path"""
@@ -111,15 +172,42 @@ class FileBrowserAdapter(BaseServiceAdapter):
         try:
             # FileBrowser expects paths without leading slash in API
             api_path = path.lstrip("/")
-            url = f"{self.api_base}/resources/{api_path}"
+            with self._state_lock:
+                cached = self._listing_cache.get(api_path)
+            if cached:
+                if time.monotonic() < cached[0]:
+                    return [dict(item) for item in cached[2]]
+                if cached[1]:
+                    headers["If-None-Match"] = cached[1]
+                
+            url = f"{self.api_base}/resources/{quote(api_path)}"
             
             response = self.session.get(url, headers=headers, timeout=10)
             
+            if response.status_code == 304 and cached:
+                with self._state_lock:
+                    self._listing_cache[api_path] = (time.monotonic() + self.cache_ttl, cached[1], cached[2])
+                return [dict(item) for item in cached[2]]
             if response.status_code == 200:
-                data = response.json()
-                return self._parse_file_listing(data)
+                self._file_access_confirmed = True
+                data = parse_json_response(response)
+                items = self._parse_file_listing(data)
+                etag = response.headers.get("ETag")
+                if self.cache_ttl > 0 or etag:
+                    # Without a TTL, entries with an ETag are still kept for revalidation
+                    with self._state_lock:
+                        self._listing_cache[api_path] = (time.monotonic() + self.cache_ttl, etag, items)
+                    return [dict(item) for item in items]
+                return items
+            if response.status_code == 401:
+                # Token was rejected, so log in again next time
+                with self._state_lock:
+                    self._token_expires_at = 0.0
+            if response.status_code in (401, 403) and not self._file_access_confirmed:
+                logger.warning("FileBrowser login succeeded but file listing was refused")
+                self._withdraw_capabilities()
                 
-        except Exception as e:
+        except (requests.RequestException, ValueError) as e:
             logger.error(f"Failed to list files: {e}")
             
         return []
@@ -134,7 +222,7 @@ class FileBrowserAdapter(BaseServiceAdapter):
         try:
             # FileBrowser download endpoint
             api_path = file_path.lstrip("/")
-            url = f"{self.api_base}/raw/{api_path}"
+            url = f"{self.api_base}/raw/{quote(api_path)}"
             
             response = self.session.get(url, headers=headers, timeout=30)
             
@@ -152,7 +240,42 @@ class FileBrowserAdapter(BaseServiceAdapter):
                     "error": f"HTTP {response.status_code}"
                 }
                 
-        except Exception as e:
+        except requests.RequestException as e:
+            return {"success": False, "error": str(e)}
+    
+    def download_file_to(self, file_path: str, destination: str) -> Dict[str, Any]:
+        """Download a file from FileBrowser straight into a local file"""
+        if not self.credentials.get("token"):
+            return {"success": False, "error": "Not authenticated"}
+            
+        headers = self._get_auth_headers()
+        
+        try:
+            api_path = file_path.lstrip("/")
+            url = f"{self.api_base}/raw/{quote(api_path)}"
+            
+            with self.session.get(url, headers=headers, timeout=60, stream=True) as response:
+                if response.status_code != 200:
+                    return {
+                        "success": False,
+                        "error": f"HTTP {response.status_code}"
+                    }
+                    
+                # Copy the raw stream in C, still undoing any Content-Encoding
+                response.raw.decode_content = True
+                with open(destination, "wb") as output:
+                    shutil.copyfileobj(response.raw, output, DOWNLOAD_COPY_BUFFER_SIZE)
+                    content_size = output.tell()
+                    
+                return {
+                    "success": True,
+                    "destination": destination,
+                    "content_type": response.headers.get("content-type", ""),
+                    "content_size": content_size,
+                    "file_path": file_path
+                }
+                
+        except (requests.RequestException, urllib3.exceptions.HTTPError, OSError) as e:
             return {"success": False, "error": str(e)}
     
     def parse_response(self, response: Any, operation: str) -> Any:
@@ -163,36 +286,101 @@ class FileBrowserAdapter(BaseServiceAdapter):
     # Private helper methods
     
     def _login(self, username: str, password: str) -> Optional[str]:
-        """Login to FileBrowser and get auth token"""
-        try:
-            response = self.session.post(
-                f"{self.api_base}/login",
-                json={"username": username, "password": password},
-                timeout=5
-            )
+        """Login to FileBrowser and get auth token, reusing the current one until it expires"""
+        # One login at a time, so concurrent token refreshes do not interleave their cache resets
+        with self._login_lock:
+            if (
+                self.credentials.get("token")
+                and self.credentials.get("username") == username
+                and self.credentials.get("password") == password
+                and time.monotonic() < self._token_expires_at
+            ):
+                return self.credentials["token"]
             
-            if response.status_code == 200:
-                # Token is returned as a plain string in quotes
-                token = response.text.strip('"')
-                return token
+            try:
+                response = self.session.post(
+                    f"{self.api_base}/login",
+                    data=encode_json_body({"username": username, "password": password}),
+                    headers=JSON_HEADERS,
+                    timeout=5
+                )
+            
+                if response.status_code == 200:
+                    # Token is returned as a plain string in quotes
+                    token = response.text.strip('"')
+                    with self._state_lock:
+                        self._token_expires_at = time.monotonic() + TOKEN_REUSE_TTL
+                        # Listings cached under a previous session may not match this user's view
+                        self._listing_cache.clear()
+                        self._file_index = None
+                    return token
                 
-        except Exception as e:
-            logger.debug(f"FileBrowser login failed: {e}")
+            except requests.RequestException as e:
+                logger.debug(f"FileBrowser login failed: {e}")
             
-        return None
+            return None
+    
     
-    def _test_file_access(self, token: str) -> bool:
-        """Test if token provides file access"""
+    def _search_on_server(
+        self, terms: List[str], term_pattern: re.Pattern
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Find files whose names contain any term using the /api/search/ endpoint
+        
+        The server ORs the words of an unquoted query, so multi-word terms are sent quoted
+        and single words as-is; hits are kept only if term_pattern matches their lowercased
+        name, as in the crawl fallback. Unlike the crawl, which stops three levels deep, the server
+        searches the whole tree, so it can also find deeper files. Search hits carry no
+        size or modification time unless the server includes them.
+        
+        Returns None when the endpoint is unavailable so the caller can crawl instead.
+        """
+        if not self._search_endpoint_available:
+            return None
+            
+        headers = self._get_auth_headers()
+        matches: Dict[str, Dict[str, Any]] = {}
+        
         try:
-            headers = {"X-Auth": token}
-            response = self.session.get(
-                f"{self.api_base}/resources/",
-                headers=headers,
-                timeout=5
-            )
-            return response.status_code == 200
-        except:
-            return False
+            for term in terms:
+                if len(matches) >= MAX_SEARCH_RESULTS:
+                    break
+                    
+                response = self.session.get(
+                    f"{self.api_base}/search/",
+                    params={"query": f'"{term}"' if " " in term else term},
+                    headers=headers,
+                    timeout=10
+                )
+                
+                if response.status_code in (404, 405):
+                    self._search_endpoint_available = False
+                    return None
+                if response.status_code != 200:
+                    return None
+                    
+                for item in parse_json_response(response):
+                    path = "/" + item.get("path", "").lstrip("/")
+                    if item.get("dir") or path in matches:
+                        continue
+                    name = path.rsplit("/", 1)[-1]
+                    if not term_pattern.search(name.lower()):
+                        continue
+                    # Skip hidden directories, as the crawl does
+                    if any(part.startswith(".") for part in path.split("/")[1:-1]):
+                        continue
+                    matches[path] = {
+                        "name": name,
+                        "path": path,
+                        "type": "file",
+                        "size": item.get("size", 0),
+                        "modified": item.get("modified", "")
+                    }
+                    
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"FileBrowser search failed: {e}")
+            return None
+            
+        return list(matches.values())
     
     def _get_auth_headers(self) -> Dict[str, str]:
         """Get FileBrowser-specific auth headers"""
@@ -203,8 +391,6 @@ class FileBrowserAdapter(BaseServiceAdapter):
     
     def _parse_file_listing(self, data: Any) -> List[Dict[str, Any]]:
         """Parse FileBrowser file listing response"""
-        files = []
-        
         if isinstance(data, dict):
             # Single directory info with items
             items = data.get("items", [])
@@ -212,34 +398,105 @@ class FileBrowserAdapter(BaseServiceAdapter):
             # Direct list of items
             items = data
         else:
-            return files
+            return []
             
-        for item in items:
-            file_info = {
+        return [
+            {
                 "name": item.get("name", ""),
                 "path": item.get("path", ""),
-                "type": "directory" if item.get("isDir", False) else "file",
+                "type": "directory" if item.get("isDir") else "file",
                 "size": item.get("size", 0),
                 "modified": item.get("modified", "")
             }
-            files.append(file_info)
+            for item in items
+        ]
+    
+    def _indexed_files(self) -> Tuple[List[Dict[str, Any]], List[str], Optional[Dict[str, Set[int]]]]:
+        """Crawl all files and index their lowercased names by trigram, reusing the index within the cache TTL"""
+        now = time.monotonic()
+        if self._file_index and now < self._file_index[0]:
+            return self._file_index[1:]
             
-        return files
+        files = self._list_all_files()
+        names = [file_info.get("name", "").lower() for file_info in files]
+        if self.cache_ttl <= 0:
+            # Live mode: the index would not outlive this search
+            return files, names, None
+            
+        trigram_index: Dict[str, Set[int]] = defaultdict(set)
+        for position, name in enumerate(names):
+            for start in range(len(name) - 2):
+                trigram_index[name[start:start + 3]].add(position)
+                
+        self._file_index = (now + self.cache_ttl, files, names, trigram_index)
+        return files, names, trigram_index
+    
+    @staticmethod
+    def _trigram_candidates(
+        terms: List[str], names: List[str], trigram_index: Optional[Dict[str, Set[int]]]
+    ) -> Sequence[int]:
+        """Positions, in crawl order, of names that may contain any of the terms"""
+        if trigram_index is None:
+            return range(len(names))
+            
+        candidates: Set[int] = set()
+        for term in terms:
+            term = term.lower()
+            if len(term) < 3:
+                # Too short to narrow down by trigram
+                return range(len(names))
+            candidates.update(set.intersection(
+                *(trigram_index.get(term[start:start + 3], set()) for start in range(len(term) - 2))
+            ))
+            
+        return sorted(candidates)
     
     def _list_all_files(self, path: str = "/", max_depth: int = 3) -> List[Dict[str, Any]]:
-        """Recursively list all files (with depth limit)"""
+        """Recursively list all files (with depth limit)
+
+        Directories are fetched level by level, with every directory of a level
+        listed concurrently; files are then collected in depth-first order.
+        """
+        listings: Dict[str, List[Dict[str, Any]]] = {}
+        level = [path]
+
+        with ThreadPoolExecutor(max_workers=MAX_LISTING_WORKERS) as executor:
+            for _ in range(max_depth):
+                level = list(dict.fromkeys(dir_path for dir_path in level if dir_path not in listings))
+                if not level:
+                    break
+                listings.update(zip(level, executor.map(self.list_files, level)))
+                level = [
+                    self._subdirectory_path(dir_path, item)
+                    for dir_path in level
+                    for item in listings[dir_path]
+                    if self._is_crawlable_directory(item)
+                ]
+
+        return self._collect_files(path, listings, max_depth)
+
+    def _collect_files(
+        self, path: str, listings: Dict[str, List[Dict[str, Any]]], max_depth: int
+    ) -> List[Dict[str, Any]]:
+        """Walk fetched directory listings depth-first and collect the files"""
         if max_depth <= 0:
             return []
-            
+
         files = []
-        items = self.list_files(path)
-        
-        for item in items:
+        for item in listings.get(path, []):
             if item["type"] == "file":
                 files.append(item)
-            elif item["type"] == "directory" and not item["name"].startswith("."):
-                # Recurse into subdirectories
-                subpath = item.get("path", f"{path}/{item['name']}".replace("//", "/"))
-                files.extend(self._list_all_files(subpath, max_depth - 1))
-                
-        return files
\ No newline at end of file
+            elif self._is_crawlable_directory(item):
+                files.extend(self._collect_files(self._subdirectory_path(path, item), listings, max_depth - 1))
+
+        return files
+
+    @staticmethod
+    def _is_crawlable_directory(item: Dict[str, Any]) -> bool:
+        """Check whether a listing entry is a directory the crawl should descend into"""
+        return item["type"] == "directory" and not item["name"].startswith(".")
+
+    @staticmethod
+    def _subdirectory_path(path: str, item: Dict[str, Any]) -> str:
+        """Path of a directory entry, falling back to joining it onto its parent"""
+        return item.get("path") or posixpath.join(path, item["name"])
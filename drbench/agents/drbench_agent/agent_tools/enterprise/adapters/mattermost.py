@@ -1,20 +1,54 @@
 """Mattermost service adapter implementation"""
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 import requests
 
-from ..base import BaseServiceAdapter, ServiceCapabilities, AuthMethod
+from ..base import (
+    BaseServiceAdapter,
+    ServiceCapabilities,
+    AuthMethod,
+    JSON_HEADERS,
+    encode_json_body,
+    parse_json_response
+)
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of users, channels or teams kept in each metadata cache
+METADATA_CACHE_SIZE = 1024
+
+# Upper bound on per-ID channel/team lookups issued concurrently
+MAX_RESOLVE_WORKERS = 16
+
 
 class MattermostAdapter(BaseServiceAdapter):
     """Adapter for Mattermost API v4 integration"""
     
+    # Login body field that last worked, shared by all adapters: api_base -> field name
+    _login_schema_cache: Dict[str, str] = {}
+    
     def __init__(self, config: Dict[str, Any], session: Optional[requests.Session] = None):
-        super().__init__("mattermost", config, session or requests.Session())
+        super().__init__("mattermost", config, session)
         self.auth_method = AuthMethod.TOKEN
         self.api_base = f"{self.base_url}/api/v4"
+        # LRU caches of user/channel/team records by ID, keyed by resource name
+        self._metadata_caches: Dict[str, OrderedDict] = {
+            "users": OrderedDict(),
+            "channels": OrderedDict(),
+            "teams": OrderedDict()
+        }
+        # Lookups currently being fetched, (resource, id) -> record future, so concurrent
+        # callers asking for the same ID wait for one request instead of sending their own
+        self._inflight_lookups: Dict[Tuple[str, str], Future] = {}
+        self._lookup_lock = threading.Lock()
+        # Cleared for a resource once the server rejects its ``/{resource}/ids`` bulk route;
+        # /users/ids is part of API v4, channels and teams may only be fetched one by one
+        self._bulk_route_available: Dict[str, bool] = {"channels": True, "teams": True}
+        # Last team listing and its ETag, revalidated with a conditional GET
+        self._teams_listing: Tuple[Optional[str], List[Dict[str, Any]]] = (None, [])
         
     def discover_capabilities(self) -> Dict[str, Any]:
         """Discover Mattermost capabilities and endpoints"""
@@ -22,37 +56,45 @@ class MattermostAdapter(BaseServiceAdapter):
         endpoints = {}
         working_credentials = None
         
-        # Test basic connectivity
-        if self._test_connectivity():
+        token = self.config.get("token")
+        credentials = self.config.get("credentials", {})
+        username = credentials.get("username") or self.config.get("username", "admin")
+        password = credentials.get("password") or self.config.get("password", "admin")
+        
+        self._clear_metadata_caches()
+        
+        # Test basic connectivity in the background while authenticating
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            connectivity = executor.submit(self._test_connectivity)
+            
+            # Try token first, then login
+            if token:
+                self.credentials["token"] = token
+                if self._test_authenticated_access(token):
+                    working_credentials = {"token": token}
+            elif username and password:
+                # Try to login
+                auth_token = self._login(username, password)
+                if auth_token:
+                    working_credentials = {
+                        "token": auth_token,
+                        "username": username,
+                        "password": password
+                    }
+                    
+            reachable = connectivity.result()
+            
+        if reachable:
             capabilities.extend([
                 ServiceCapabilities.SYSTEM_INFO,
                 ServiceCapabilities.HEALTH_CHECK
             ])
             endpoints["ping"] = f"{self.api_base}/system/ping"
             
-        # Try to authenticate and discover more capabilities
-        token = self.config.get("token")
-        credentials = self.config.get("credentials", {})
-        username = credentials.get("username") or self.config.get("username", "admin")
-        password = credentials.get("password") or self.config.get("password", "admin")
-        
-        # Try token first, then login
-        if token:
-            self.credentials["token"] = token
-            if self._test_authenticated_access(token):
-                working_credentials = {"token": token}
-                self._add_authenticated_capabilities(capabilities, endpoints)
-        elif username and password:
-            # Try to login
-            auth_token = self._login(username, password)
-            if auth_token:
-                working_credentials = {
-                    "token": auth_token,
-                    "username": username,
-                    "password": password
-                }
-                self._add_authenticated_capabilities(capabilities, endpoints)
-                
+        # Authenticated access unlocks the remaining capabilities
+        if working_credentials:
+            self._add_authenticated_capabilities(capabilities, endpoints)
+            
         self.capabilities = capabilities
         self.endpoints = endpoints
         self.credentials = working_credentials or {"username": username, "password": password}
@@ -70,6 +112,8 @@ class MattermostAdapter(BaseServiceAdapter):
         username = credentials.get("username")
         password = credentials.get("password")
         
+        self._clear_metadata_caches()
+        
         # Try token authentication first
         if token and self._test_authenticated_access(token):
             self.credentials["token"] = token
@@ -99,21 +143,21 @@ class MattermostAdapter(BaseServiceAdapter):
             "is_or_search": True  # Use OR logic for better results
         }
         
-        headers = self._get_auth_headers()
+        headers = {**self._get_auth_headers(), **JSON_HEADERS}
         
         try:
             response = self.session.post(
                 f"{self.api_base}/posts/search",
-                json=search_data,
+                data=encode_json_body(search_data),
                 headers=headers,
                 timeout=10
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json_response(response)
                 return self._parse_search_results(data, terms)
                 
-        except Exception as e:
+        except (requests.RequestException, ValueError) as e:
             logger.error(f"Mattermost search failed: {e}")
             
         return []
@@ -160,7 +204,7 @@ class MattermostAdapter(BaseServiceAdapter):
         try:
             response = self.session.get(f"{self.api_base}/system/ping", timeout=5)
             return response.status_code == 200
-        except:
+        except requests.RequestException:
             return False
     
     def _test_authenticated_access(self, token: str) -> bool:
@@ -173,22 +217,25 @@ class MattermostAdapter(BaseServiceAdapter):
                 timeout=5
             )
             return response.status_code == 200
-        except:
+        except requests.RequestException:
             return False
     
     def _login(self, username: str, password: str) -> Optional[str]:
         """Login to Mattermost and get auth token"""
-        login_methods = [
-            {"login_id": username, "password": password},
-            {"email": username, "password": password},
-            {"username": username, "password": password}
-        ]
+        login_fields = ["login_id", "email", "username"]
         
-        for login_data in login_methods:
+        # Try the field that worked last time first
+        cached_field = self._login_schema_cache.get(self.api_base)
+        if cached_field in login_fields:
+            login_fields.remove(cached_field)
+            login_fields.insert(0, cached_field)
+            
+        for login_field in login_fields:
             try:
                 response = self.session.post(
                     f"{self.api_base}/users/login",
-                    json=login_data,
+                    data=encode_json_body({login_field: username, "password": password}),
+                    headers=JSON_HEADERS,
                     timeout=5
                 )
                 
@@ -196,9 +243,10 @@ class MattermostAdapter(BaseServiceAdapter):
                     # Extract token from headers
                     token = response.headers.get("Token") or response.headers.get("Authorization")
                     if token:
+                        self._login_schema_cache[self.api_base] = login_field
                         return token
                         
-            except Exception as e:
+            except requests.RequestException as e:
                 logger.debug(f"Login attempt failed: {e}")
                 
         return None
@@ -222,7 +270,10 @@ class MattermostAdapter(BaseServiceAdapter):
     def _list_teams(self) -> List[Dict[str, Any]]:
         """List all teams accessible to the user"""
         headers = self._get_auth_headers()
-        
+        etag, teams = self._teams_listing
+        if etag:
+            headers["If-None-Match"] = etag
+            
         try:
             response = self.session.get(
                 f"{self.api_base}/teams",
@@ -230,10 +281,14 @@ class MattermostAdapter(BaseServiceAdapter):
                 timeout=10
             )
             
+            if response.status_code == 304 and etag:
+                return list(teams)
             if response.status_code == 200:
-                return response.json()
+                teams = parse_json_response(response)
+                self._teams_listing = (response.headers.get("ETag"), teams)
+                return list(teams)
                 
-        except Exception as e:
+        except (requests.RequestException, ValueError) as e:
             logger.error(f"Failed to list teams: {e}")
             
         return []
@@ -244,11 +299,18 @@ class MattermostAdapter(BaseServiceAdapter):
         
         posts = data.get("posts", {})
         order = data.get("order", [])
+        top_posts = [(post_id, posts.get(post_id, {})) for post_id in order[:20]]  # Limit to first 20 results
         
-        for post_id in order[:20]:  # Limit to first 20 results
-            post = posts.get(post_id, {})
-            
-            # Resolve user and channel info if possible
+        # Resolve all users, channels and teams up front, batching requests where the server allows
+        users_by_id: Dict[str, Dict[str, Any]] = {}
+        channels_by_id: Dict[str, Dict[str, Any]] = {}
+        teams_by_id: Dict[str, Dict[str, Any]] = {}
+        if top_posts and self.credentials.get("token"):
+            users_by_id = self._bulk_resolve_users([post.get("user_id", "") for _, post in top_posts])
+            channels_by_id = self._bulk_resolve_channels([post.get("channel_id", "") for _, post in top_posts])
+            teams_by_id = self._bulk_resolve_teams([channel.get("team_id") for channel in channels_by_id.values()])
+        
+        for post_id, post in top_posts:
             user_id = post.get("user_id", "")
             channel_id = post.get("channel_id", "")
             
@@ -262,10 +324,10 @@ class MattermostAdapter(BaseServiceAdapter):
                 "relevance_reason": f"Message contains: {search_terms}"
             }
             
-            # Try to resolve names
+            # Attach resolved names if possible
             if self.credentials.get("token"):
-                user_name = self._resolve_user_id(user_id)
-                team_name, channel_name = self._resolve_channel_id(channel_id)
+                user_name = self._user_display_name(user_id, users_by_id)
+                team_name, channel_name = self._channel_display_names(channel_id, channels_by_id, teams_by_id)
                 
                 result.update({
                     "user_name": user_name,
@@ -282,68 +344,169 @@ class MattermostAdapter(BaseServiceAdapter):
         if not user_id or not self.credentials.get("token"):
             return user_id
             
+        return self._user_display_name(user_id, self._bulk_resolve_users([user_id]))
+    
+    def _resolve_channel_id(self, channel_id: str) -> Tuple[str, str]:
+        """Resolve channel ID to team and channel names"""
+        if not channel_id or not self.credentials.get("token"):
+            return "unknown", channel_id
+            
+        channels_by_id = self._bulk_resolve_channels([channel_id])
+        teams_by_id = self._bulk_resolve_teams([channel.get("team_id") for channel in channels_by_id.values()])
+        return self._channel_display_names(channel_id, channels_by_id, teams_by_id)
+    
+    def _bulk_resolve_users(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch users by ID in a single request, keyed by ID"""
+        return self._bulk_resolve("users", user_ids)
+    
+    def _bulk_resolve_channels(self, channel_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch channels by ID, keyed by ID"""
+        return self._bulk_resolve("channels", channel_ids)
+    
+    def _bulk_resolve_teams(self, team_ids: List[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+        """Fetch teams by ID, keyed by ID"""
+        return self._bulk_resolve("teams", team_ids)
+    
+    def _bulk_resolve(self, resource: str, ids: List[Optional[str]]) -> Dict[str, Dict[str, Any]]:
+        """Look up records by ID, serving cached ones and fetching the rest from the server"""
+        cache = self._metadata_caches[resource]
+        records = {}
+        missing_ids = []
+        pending: Dict[str, Future] = {}
+        
+        with self._lookup_lock:
+            for record_id in dict.fromkeys(filter(None, ids)):
+                if record_id in cache:
+                    cache.move_to_end(record_id)
+                    records[record_id] = cache[record_id]
+                elif (resource, record_id) in self._inflight_lookups:
+                    pending[record_id] = self._inflight_lookups[(resource, record_id)]
+                else:
+                    missing_ids.append(record_id)
+                    self._inflight_lookups[(resource, record_id)] = Future()
+                    
+        if missing_ids:
+            fetched = {}
+            try:
+                fetched = self._fetch_records(resource, missing_ids)
+                records.update(fetched)
+            finally:
+                with self._lookup_lock:
+                    cache.update(fetched)
+                    while len(cache) > METADATA_CACHE_SIZE:
+                        cache.popitem(last=False)
+                    for record_id in missing_ids:
+                        self._inflight_lookups.pop((resource, record_id)).set_result(fetched.get(record_id))
+                        
+        for record_id, future in pending.items():
+            record = future.result()
+            if record:
+                records[record_id] = record
+                
+        return records
+    
+    def _fetch_records(self, resource: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch records by ID from the server, keyed by ID
+        
+        Users come from one ``POST /users/ids``. Channels and teams try the same bulk form
+        while the server accepts it, then fetch whatever is still unresolved with per-ID GETs.
+        """
+        if resource == "users":
+            return self._post_record_ids(resource, ids)
+            
+        records = self._post_record_ids(resource, ids) if self._bulk_route_available[resource] else {}
+        unresolved = [record_id for record_id in ids if record_id not in records]
+        if unresolved:
+            with ThreadPoolExecutor(max_workers=min(MAX_RESOLVE_WORKERS, len(unresolved))) as executor:
+                fetched = executor.map(lambda record_id: self._get_record(resource, record_id), unresolved)
+                records.update((record_id, record) for record_id, record in zip(unresolved, fetched) if record)
+        return records
+    
+    def _post_record_ids(self, resource: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """POST IDs to ``/{resource}/ids`` and key the returned records by ID"""
         try:
-            headers = self._get_auth_headers()
-            response = self.session.get(
-                f"{self.api_base}/users/{user_id}",
-                headers=headers,
+            response = self.session.post(
+                f"{self.api_base}/{resource}/ids",
+                data=encode_json_body(ids),
+                headers={**self._get_auth_headers(), **JSON_HEADERS},
                 timeout=5
             )
             
             if response.status_code == 200:
-                user_data = response.json()
-                return (
-                    user_data.get("username") or
-                    user_data.get("nickname") or
-                    f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip() or
-                    user_id
-                )
-        except:
-            pass
+                return {record["id"]: record for record in parse_json_response(response) if record.get("id")}
+            if response.status_code in (401, 403):
+                # Access changed, so cached records may no longer be visible to us
+                self._clear_metadata_caches()
+            elif response.status_code in (404, 405) and resource in self._bulk_route_available:
+                # This server has no bulk route for the resource; use per-ID GETs from now on
+                self._bulk_route_available[resource] = False
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"Failed to resolve Mattermost {resource}: {e}")
             
-        return user_id
+        return {}
     
-    def _resolve_channel_id(self, channel_id: str) -> Tuple[str, str]:
-        """Resolve channel ID to team and channel names"""
-        if not channel_id or not self.credentials.get("token"):
-            return "unknown", channel_id
-            
+    def _get_record(self, resource: str, record_id: str) -> Optional[Dict[str, Any]]:
+        """GET a single record from ``/{resource}/{record_id}``"""
         try:
-            headers = self._get_auth_headers()
             response = self.session.get(
-                f"{self.api_base}/channels/{channel_id}",
-                headers=headers,
+                f"{self.api_base}/{resource}/{record_id}",
+                headers=self._get_auth_headers(),
                 timeout=5
             )
             
             if response.status_code == 200:
-                channel_data = response.json()
-                channel_name = (
-                    channel_data.get("display_name") or
-                    channel_data.get("name") or
-                    channel_id
-                )
-                
-                # Try to get team info
-                team_id = channel_data.get("team_id")
-                if team_id:
-                    team_response = self.session.get(
-                        f"{self.api_base}/teams/{team_id}",
-                        headers=headers,
-                        timeout=5
-                    )
-                    
-                    if team_response.status_code == 200:
-                        team_data = team_response.json()
-                        team_name = (
-                            team_data.get("display_name") or
-                            team_data.get("name") or
-                            "unknown"
-                        )
-                        return team_name, channel_name
-                        
-                return "unknown", channel_name
-        except:
-            pass
+                return parse_json_response(response)
+        except (requests.RequestException, ValueError) as e:
+            logger.debug(f"Failed to resolve Mattermost {resource} {record_id}: {e}")
+            
+        return None
+    
+    def _clear_metadata_caches(self):
+        """Drop all cached user/channel/team records"""
+        # In-flight lookups are left alone; the thread that started each one still resolves it
+        with self._lookup_lock:
+            for cache in self._metadata_caches.values():
+                cache.clear()
+            self._teams_listing = (None, [])
+    
+    @staticmethod
+    def _user_display_name(user_id: str, users_by_id: Dict[str, Dict[str, Any]]) -> str:
+        """Pick the best display name for a user, falling back to the ID"""
+        user_data = users_by_id.get(user_id)
+        if not user_data:
+            return user_id
+            
+        return (
+            user_data.get("username") or
+            user_data.get("nickname") or
+            f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip() or
+            user_id
+        )
+    
+    @staticmethod
+    def _channel_display_names(
+        channel_id: str,
+        channels_by_id: Dict[str, Dict[str, Any]],
+        teams_by_id: Dict[str, Dict[str, Any]]
+    ) -> Tuple[str, str]:
+        """Pick team and channel display names for a channel, falling back to "unknown" and the ID"""
+        channel_data = channels_by_id.get(channel_id)
+        if not channel_data:
+            return "unknown", channel_id
+            
+        channel_name = (
+            channel_data.get("display_name") or
+            channel_data.get("name") or
+            channel_id
+        )
+        
+        team_data = teams_by_id.get(channel_data.get("team_id"))
+        if not team_data:
+            return "unknown", channel_name
             
-        return "unknown", channel_id
\ No newline at end of file
+        team_name = (
+            team_data.get("display_name") or
+            team_data.get("name") or
+            "unknown"
+        )
+        return team_name, channel_name
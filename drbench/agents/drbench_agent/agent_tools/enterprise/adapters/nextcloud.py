@@ -1,21 +1,73 @@
 """Nextcloud service adapter implementation"""
+import io
 import logging
+import re
 import xml.etree.ElementTree as ET
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
 import requests
 
+try:
+    from lxml import etree as LET
+except ImportError:  # Fall back to ElementTree for WebDAV responses
+    LET = None
+
 from ..base import BaseServiceAdapter, ServiceCapabilities, AuthMethod
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on PROPFIND listings issued concurrently while crawling
+MAX_LISTING_WORKERS = 8
+
+# WebDAV properties read from each PROPFIND <response>, first occurrence of each
+DAV_NAMESPACE = "DAV:"
+PROPFIND_FIELDS = ("href", "displayname", "resourcetype", "getcontentlength", "getlastmodified")
+_FIELDS_BY_TAG = {f"{{{DAV_NAMESPACE}}}{field}": field for field in PROPFIND_FIELDS}
+_RESPONSE_TAG = f"{{{DAV_NAMESPACE}}}response"
+
+# Request body and headers shared by every single-level PROPFIND
+_PROPFIND_BODY = (
+    b'<?xml version="1.0" encoding="utf-8"?>'
+    b'<D:propfind xmlns:D="DAV:"><D:prop>'
+    b'<D:displayname/><D:resourcetype/><D:getcontentlength/><D:getlastmodified/>'
+    b'</D:prop></D:propfind>'
+)
+_PROPFIND_HEADERS = {
+    "Depth": "1",
+    "Content-Type": "application/xml; charset=utf-8",
+    "Accept": "application/xml"
+}
+
+# Maximum number of files returned by the WebDAV fallback search
+MAX_SEARCH_RESULTS = 20
+
+if LET is not None:
+    # Single query returning every field of a <response> at once
+    _XP_RESPONSE_FIELDS = LET.XPath(
+        " | ".join(f"(.//D:{field})[1]" for field in PROPFIND_FIELDS),
+        namespaces={"D": DAV_NAMESPACE}
+    )
+
 
 class NextcloudAdapter(BaseServiceAdapter):
     """Adapter for Nextcloud WebDAV and OCS API integration"""
     
     def __init__(self, config: Dict[str, Any], session: Optional[requests.Session] = None):
-        super().__init__("nextcloud", config, session or requests.Session())
+        super().__init__("nextcloud", config, session)
         self.auth_method = AuthMethod.BASIC
         
+    @property
+    def credentials(self) -> Dict[str, Any]:
+        return self._credentials
+    
+    @credentials.setter
+    def credentials(self, credentials: Dict[str, Any]):
+        """Store credentials and use them as the session's basic auth for every request"""
+        self._credentials = credentials
+        username = credentials.get("username")
+        password = credentials.get("password")
+        self.session.auth = (username, password) if username and password else None
+        
     def discover_capabilities(self) -> Dict[str, Any]:
         """Discover Nextcloud capabilities and endpoints"""
         capabilities = []
@@ -36,7 +88,13 @@ class NextcloudAdapter(BaseServiceAdapter):
                 
             logger.debug(f"Trying Nextcloud credentials: {username}")
             
-            if self._test_webdav_access(username, password):
+            # Probe the OCS API in the background while testing WebDAV access
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                ocs_access = executor.submit(self._test_ocs_api, username, password)
+                webdav_access = self._test_webdav_access(username, password)
+                has_ocs_api = ocs_access.result()
+                
+            if webdav_access:
                 working_credentials = {"username": username, "password": password}
                 capabilities.extend([
                     ServiceCapabilities.FILE_LISTING,
@@ -47,8 +105,8 @@ class NextcloudAdapter(BaseServiceAdapter):
                 endpoints["download_file"] = endpoints["list_files"] + "{filepath}"
                 endpoints["search_files"] = f"{self.base_url}/index.php/apps/files/api/v1/search"
                 
-                # Test OCS API for additional features
-                if self._test_ocs_api(username, password):
+                # OCS API gives additional features
+                if has_ocs_api:
                     capabilities.append(ServiceCapabilities.SHARING_MANAGEMENT)
                     endpoints["list_shares"] = f"{self.base_url}/ocs/v2.php/apps/files_sharing/api/v1/shares"
                     
@@ -111,9 +169,9 @@ class NextcloudAdapter(BaseServiceAdapter):
         full_url = self.base_url + path
         
         try:
-            response = self._propfind_request(full_url)
-            if response.status_code == 207:  # Multi-Status
-                return self._parse_propfind_response(response.text)
+            with self._propfind_request(full_url, stream=True) as response:
+                if response.status_code == 207:  # Multi-Status
+                    return list(self._iter_propfind(response))
         except Exception as e:
             logger.error(f"Failed to list files: {e}")
             
@@ -134,11 +192,7 @@ class NextcloudAdapter(BaseServiceAdapter):
             download_url = f"{self.base_url}/remote.php/dav/files/{username}/{file_path.lstrip('/')}"
             
         try:
-            response = self.session.get(
-                download_url,
-                auth=(username, password),
-                timeout=30
-            )
+            response = self.session.get(download_url, timeout=30)
             
             if response.status_code == 200:
                 return {
@@ -161,10 +215,7 @@ class NextcloudAdapter(BaseServiceAdapter):
         """Parse Nextcloud-specific response formats"""
         if operation in ["list", "search"] and isinstance(response, str):
             # Parse WebDAV XML response
-            try:
-                return self._parse_propfind_response(response)
-            except ET.ParseError:
-                return []
+            return self._parse_propfind_response(response)
         return response
     
     # Private helper methods
@@ -199,63 +250,75 @@ class NextcloudAdapter(BaseServiceAdapter):
         except:
             return False
     
-    def _propfind_request(self, url: str, auth: Optional[tuple] = None) -> requests.Response:
-        """Execute a PROPFIND request"""
-        if not auth:
-            auth = (self.credentials.get("username"), self.credentials.get("password"))
-            
-        propfind_body = """<?xml version="1.0" encoding="utf-8" ?>
-        <D:propfind xmlns:D="DAV:">
-            <D:prop>
-                <D:displayname/>
-                <D:resourcetype/>
-                <D:getcontentlength/>
-                <D:getlastmodified/>
-            </D:prop>
-        </D:propfind>"""
-        
-        headers = {
-            "Depth": "1",
-            "Content-Type": "application/xml"
-        }
-        
+    def _propfind_request(self, url: str, auth: Optional[tuple] = None, stream: bool = False) -> requests.Response:
+        """Execute a PROPFIND request, authenticated as the session's user unless auth is given"""
         return self.session.request(
             "PROPFIND",
             url,
-            data=propfind_body,
-            headers=headers,
+            data=_PROPFIND_BODY,
+            headers=_PROPFIND_HEADERS,
             auth=auth,
-            timeout=10
+            timeout=10,
+            stream=stream
         )
     
-    def _parse_propfind_response(self, xml_content: str) -> List[Dict[str, Any]]:
+    def _parse_propfind_response(self, xml_content: Union[str, bytes]) -> List[Dict[str, Any]]:
         """Parse WebDAV PROPFIND XML response"""
-        files = []
-        
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode("utf-8")
+        return list(self._iter_propfind_entries(io.BytesIO(xml_content)))
+    
+    def _iter_propfind(self, response: requests.Response) -> Iterator[Dict[str, Any]]:
+        """Yield file entries from a streamed PROPFIND response as it arrives"""
+        response.raw.decode_content = True
+        return self._iter_propfind_entries(response.raw)
+    
+    def _iter_propfind_entries(self, source: BinaryIO) -> Iterator[Dict[str, Any]]:
+        """Incrementally parse PROPFIND XML, discarding each <response> once it is read"""
         try:
-            root = ET.fromstring(xml_content)
-            
-            for response in root.findall(".//{DAV:}response"):
-                href = response.find(".//{DAV:}href")
-                displayname = response.find(".//{DAV:}displayname")
-                resourcetype = response.find(".//{DAV:}resourcetype")
-                contentlength = response.find(".//{DAV:}getcontentlength")
-                lastmodified = response.find(".//{DAV:}getlastmodified")
-                
-                if href is not None:
-                    file_info = {
-                        "path": href.text,
-                        "name": displayname.text if displayname is not None else href.text.split("/")[-1],
-                        "type": "directory" if resourcetype is not None and resourcetype.find(".//{DAV:}collection") is not None else "file",
-                        "size": int(contentlength.text) if contentlength is not None and contentlength.text else 0,
-                        "modified": lastmodified.text if lastmodified is not None else ""
-                    }
-                    files.append(file_info)
-                    
+            if LET is not None:
+                for _, response in LET.iterparse(
+                    source, events=("end",), tag=_RESPONSE_TAG, huge_tree=True, recover=True
+                ):
+                    fields = {_FIELDS_BY_TAG[element.tag]: element for element in _XP_RESPONSE_FIELDS(response)}
+                    file_info = self._propfind_file_info(fields)
+                    response.clear()
+                    while response.getprevious() is not None:
+                        del response.getparent()[0]
+                    if file_info:
+                        yield file_info
+            else:
+                for _, response in ET.iterparse(source, events=("end",)):
+                    if response.tag != _RESPONSE_TAG:
+                        continue
+                    fields = {field: response.find(f".//{tag}") for tag, field in _FIELDS_BY_TAG.items()}
+                    file_info = self._propfind_file_info(fields)
+                    response.clear()
+                    if file_info:
+                        yield file_info
+                        
         except Exception as e:
             logger.error(f"Failed to parse WebDAV response: {e}")
+    
+    @staticmethod
+    def _propfind_file_info(fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Build a file entry from the property elements of one PROPFIND <response>"""
+        href = fields.get("href")
+        if href is None:
+            return None
             
-        return files
+        displayname = fields.get("displayname")
+        resourcetype = fields.get("resourcetype")
+        contentlength = fields.get("getcontentlength")
+        lastmodified = fields.get("getlastmodified")
+        is_collection = resourcetype is not None and resourcetype.find(f".//{{{DAV_NAMESPACE}}}collection") is not None
+        return {
+            "path": href.text,
+            "name": displayname.text if displayname is not None else href.text.split("/")[-1],
+            "type": "directory" if is_collection else "file",
+            "size": int(contentlength.text) if contentlength is not None and contentlength.text else 0,
+            "modified": lastmodified.text if lastmodified is not None else ""
+        }
     
     def _search_via_api(self, terms: List[str]) -> List[Dict[str, Any]]:
         """Search using Nextcloud Search API"""
@@ -269,11 +332,9 @@ class NextcloudAdapter(BaseServiceAdapter):
             "type": "files"
         }
         
-        auth = self._get_auth_tuple()
         response = self.session.get(
             self.endpoints["search_files"],
             params=params,
-            auth=auth,
             timeout=10
         )
         
@@ -289,36 +350,68 @@ class NextcloudAdapter(BaseServiceAdapter):
     
     def _search_via_webdav(self, terms: List[str]) -> List[Dict[str, Any]]:
         """Search by listing files and filtering"""
+        if not terms:
+            return []
+            
         all_files = self._list_all_files_recursive()
         
         # Filter files matching search terms
+        term_pattern = re.compile("|".join(re.escape(term.lower()) for term in terms))
         matching_files = []
         for file_info in all_files:
-            file_name = file_info.get("name", "").lower()
-            if any(term.lower() in file_name for term in terms):
+            if term_pattern.search(file_info.get("name", "").lower()):
                 file_info["relevance_reason"] = f"Filename matches: {terms}"
                 matching_files.append(file_info)
-                
-        return matching_files[:20]  # Limit results
+                if len(matching_files) >= MAX_SEARCH_RESULTS:
+                    break
+                    
+        return matching_files
     
     def _list_all_files_recursive(self, path: str = "/", max_depth: int = 3) -> List[Dict[str, Any]]:
-        """Recursively list all files (with depth limit)"""
+        """Recursively list all files (with depth limit)
+        
+        Directories are fetched level by level, with every directory of a level
+        listed concurrently; files are then collected in depth-first order.
+        """
+        listings: Dict[str, List[Dict[str, Any]]] = {}
+        level = [path]
+        
+        with ThreadPoolExecutor(max_workers=MAX_LISTING_WORKERS) as executor:
+            for _ in range(max_depth):
+                level = list(dict.fromkeys(dir_path for dir_path in level if dir_path not in listings))
+                if not level:
+                    break
+                listings.update(zip(level, executor.map(self.list_files, level)))
+                level = [
+                    item["path"]
+                    for dir_path in level
+                    for item in listings[dir_path]
+                    if self._is_crawlable_directory(item)
+                ]
+                
+        return self._collect_files(path, listings, max_depth)
+    
+    def _collect_files(
+        self, path: str, listings: Dict[str, List[Dict[str, Any]]], max_depth: int
+    ) -> List[Dict[str, Any]]:
+        """Walk fetched directory listings depth-first and collect the files"""
         if max_depth <= 0:
             return []
             
         files = []
-        items = self.list_files(path)
-        
-        for item in items:
+        for item in listings.get(path, []):
             if item["type"] == "file":
                 files.append(item)
-            elif item["type"] == "directory" and not item["name"].startswith("."):
-                # Recurse into subdirectories
-                subpath = item["path"]
-                files.extend(self._list_all_files_recursive(subpath, max_depth - 1))
+            elif self._is_crawlable_directory(item):
+                files.extend(self._collect_files(item["path"], listings, max_depth - 1))
                 
         return files
     
+    @staticmethod
+    def _is_crawlable_directory(item: Dict[str, Any]) -> bool:
+        """Check whether a listing entry is a directory the crawl should descend into"""
+        return item["type"] == "directory" and not item["name"].startswith(".")
+    
     def _convert_search_results(self, api_results: Any) -> List[Dict[str, Any]]:
         """Convert API search results to standard format"""
         # Implementation depends on Nextcloud search API response format
@@ -1,10 +1,69 @@
 """Base classes and interfaces for enterprise service adapters"""
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional, Tuple
+import json
 import logging
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # Optional: faster JSON decoding for large API responses
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Connection pooling and retry policy for adapter-created HTTP sessions
+HTTP_POOL_CONNECTIONS = 8
+HTTP_POOL_MAXSIZE = 64
+HTTP_RETRY_TOTAL = 2
+HTTP_RETRY_BACKOFF_FACTOR = 0.2
+HTTP_RETRY_STATUS_CODES = (502, 503, 504)
+HTTP_USER_AGENT = "DrBench-Agent/1.0"
+
+# Headers for requests whose body was encoded with encode_json_body
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def create_http_session() -> requests.Session:
+    """
+    Create a keep-alive session for adapters talking to REST services
+    
+    The session mounts a pooled HTTPAdapter large enough for concurrent requests
+    and retries idempotent requests on transient gateway errors.
+    """
+    session = requests.Session()
+    http_adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=Retry(
+            total=HTTP_RETRY_TOTAL,
+            backoff_factor=HTTP_RETRY_BACKOFF_FACTOR,
+            status_forcelist=HTTP_RETRY_STATUS_CODES,
+            raise_on_status=False
+        )
+    )
+    session.mount("http://", http_adapter)
+    session.mount("https://", http_adapter)
+    session.headers.update({"Connection": "keep-alive", "User-Agent": HTTP_USER_AGENT})
+    return session
+
+
+def parse_json_response(response: requests.Response) -> Any:
+    """Decode a JSON response body, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def encode_json_body(payload: Any) -> bytes:
+    """Encode a request body as compact JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
 
 class BaseServiceAdapter(ABC):
     """Base class for all enterprise service adapters
@@ -20,17 +79,19 @@ class BaseServiceAdapter(ABC):
         base_url: Optional web interface URL (not used for protocol-specific connections)
         endpoints: Dict of discovered endpoints for documentation purposes
         credentials: Credentials from configuration (should not contain defaults)
+        discovery_cache: DiscoveryCache holding this adapter's discovery results, if any
     """
     
     def __init__(self, service_name: str, config: Dict[str, Any], session=None):
         self.service_name = service_name
         self.config = config
         self.base_url = config.get("url", "")  # Optional web interface URL
-        self.session = session
+        self.session = session if session is not None else create_http_session()
         self.capabilities = {}
         self.endpoints = {}  # For documentation/debugging, not for connection
         self.auth_method = "none"
         self.credentials = {}  # Should only contain validated credentials from config
+        self.discovery_cache = None  # Set by ServiceDiscovery
         
     @abstractmethod
     def discover_capabilities(self) -> Dict[str, Any]:
@@ -180,6 +241,17 @@ class BaseServiceAdapter(ABC):
         result.update(kwargs)
         return result
     
+    def _withdraw_capabilities(self):
+        """Drop all capabilities, also from the cached discovery results so they are not re-advertised"""
+        self.capabilities = []
+        self.endpoints = {}
+        if self.discovery_cache is not None:
+            cached_results = self.discovery_cache.get(self.service_name, self.config)
+            if cached_results:
+                self.discovery_cache.set(
+                    self.service_name, self.config, dict(cached_results, capabilities=[], endpoints={})
+                )
+    
     def _get_auth_headers(self) -> Dict[str, str]:
         """Get authentication headers based on auth method"""
         headers = {}
@@ -1,13 +1,23 @@
 """Service discovery with caching capabilities"""
 import json
 import os
+import tempfile
+import threading
 import time
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on services discovered concurrently
+MAX_DISCOVERY_WORKERS = 8
+
+# Maximum number of discovery results kept by the in-memory cache (least recently used are evicted)
+MEMORY_CACHE_MAX_ENTRIES = 1024
+
 
 class DiscoveryCache:
     """Manages caching of service discovery results"""
@@ -24,8 +34,10 @@ class DiscoveryCache:
         self.ttl = ttl
         self.use_file_cache = use_file_cache
         
-        # In-memory cache
-        self._memory_cache = {}
+        # In-memory cache in least-recently-used order, shared by concurrent discoveries
+        self._memory_cache: OrderedDict = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self.max_entries = MEMORY_CACHE_MAX_ENTRIES
         
         # File-based cache setup
         if use_file_cache:
@@ -36,9 +48,9 @@ class DiscoveryCache:
         
     def get_cache_key(self, service_name: str, config: Dict[str, Any]) -> str:
         """Generate a unique cache key for a service configuration"""
-        # Create a deterministic key from service name and config
-        config_str = json.dumps(config, sort_keys=True)
-        hash_obj = hashlib.md5(f"{service_name}:{config_str}".encode())
+        # Sort keys at every level so equal configs (e.g. credentials in another order) share a key
+        config_str = json.dumps(config, sort_keys=True, default=str)
+        hash_obj = hashlib.blake2b(f"{service_name}:{config_str}".encode(), digest_size=16)
         return hash_obj.hexdigest()
     
     def get(self, service_name: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -63,18 +75,20 @@ class DiscoveryCache:
         """Get from in-memory cache"""
         full_key = f"{service_name}_{cache_key}"
         
-        if full_key not in self._memory_cache:
-            logger.debug(f"Memory cache miss for {service_name}")
-            return None
-        
-        cached_data = self._memory_cache[full_key]
-        
-        # Check if cache is expired
-        if time.time() - cached_data.get("timestamp", 0) > self.ttl:
-            logger.debug(f"Memory cache expired for {service_name}")
-            del self._memory_cache[full_key]
-            return None
-        
+        with self._memory_lock:
+            cached_data = self._memory_cache.get(full_key)
+            if cached_data is None:
+                logger.debug(f"Memory cache miss for {service_name}")
+                return None
+                
+            # Check if cache is expired
+            if time.time() - cached_data.get("timestamp", 0) > self.ttl:
+                logger.debug(f"Memory cache expired for {service_name}")
+                del self._memory_cache[full_key]
+                return None
+                
+            self._memory_cache.move_to_end(full_key)
+            
         logger.info(f"Memory cache hit for {service_name}")
         return cached_data.get("discovery_results")
     
@@ -82,13 +96,21 @@ class DiscoveryCache:
         """Get from file-based cache"""
         cache_file = os.path.join(self.cache_dir, f"{service_name}_{cache_key}.json")
         
-        if not os.path.exists(cache_file):
+        try:
+            modified_at = os.stat(cache_file).st_mtime
+        except FileNotFoundError:
             logger.debug(f"File cache miss for {service_name}")
             return None
             
         try:
-            with open(cache_file, "r") as f:
-                cached_data = json.load(f)
+            # The file is written just after its timestamp, so a stale mtime means a stale entry
+            if time.time() - modified_at > self.ttl:
+                logger.debug(f"File cache expired for {service_name}")
+                os.remove(cache_file)
+                return None
+                
+            with open(cache_file, "rb") as f:
+                cached_data = json.loads(f.read())
                 
             # Check if cache is expired
             if time.time() - cached_data.get("timestamp", 0) > self.ttl:
@@ -128,19 +150,29 @@ class DiscoveryCache:
     def _set_to_memory(self, service_name: str, cache_key: str, cache_data: Dict[str, Any]):
         """Set to in-memory cache"""
         full_key = f"{service_name}_{cache_key}"
-        self._memory_cache[full_key] = cache_data
+        with self._memory_lock:
+            self._memory_cache[full_key] = cache_data
+            self._memory_cache.move_to_end(full_key)
+            while len(self._memory_cache) > self.max_entries:
+                self._memory_cache.popitem(last=False)
         logger.info(f"Cached discovery results in memory for {service_name}")
     
     def _set_to_file(self, service_name: str, cache_key: str, cache_data: Dict[str, Any]):
         """Set to file-based cache"""
         cache_file = os.path.join(self.cache_dir, f"{service_name}_{cache_key}.json")
         
+        # Write to a temporary file and rename it into place, so readers never see a partial entry
+        temp_file = None
         try:
-            with open(cache_file, "w") as f:
-                json.dump(cache_data, f, indent=2)
+            fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{service_name}_", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache_data, f, separators=(",", ":"))
+            os.replace(temp_file, cache_file)
             logger.info(f"Cached discovery results to file for {service_name}")
         except Exception as e:
             logger.error(f"Error caching discovery results for {service_name}: {e}")
+            if temp_file and os.path.exists(temp_file):
+                os.remove(temp_file)
     
     def invalidate(self, service_name: str = None):
         """
@@ -158,14 +190,16 @@ class DiscoveryCache:
         """Invalidate in-memory cache"""
         if service_name:
             # Remove all cache entries for this service
-            keys_to_remove = [key for key in self._memory_cache.keys() if key.startswith(f"{service_name}_")]
-            for key in keys_to_remove:
-                del self._memory_cache[key]
+            with self._memory_lock:
+                keys_to_remove = [key for key in self._memory_cache.keys() if key.startswith(f"{service_name}_")]
+                for key in keys_to_remove:
+                    del self._memory_cache[key]
             if keys_to_remove:
                 logger.info(f"Invalidated memory cache for {service_name}")
         else:
             # Clear entire cache
-            self._memory_cache.clear()
+            with self._memory_lock:
+                self._memory_cache.clear()
             logger.info("Invalidated entire memory cache")
     
     def _invalidate_file_cache(self, service_name: str = None):
@@ -209,6 +243,9 @@ class ServiceDiscovery:
         Returns:
             Discovery results
         """
+        # Let the adapter update its entry if it later loses access
+        adapter.discovery_cache = self.cache
+        
         # Check cache first unless forced refresh
         if not force_refresh:
             cached_results = self.cache.get(adapter.service_name, adapter.config)
@@ -227,4 +264,28 @@ class ServiceDiscovery:
         # Cache the results
         self.cache.set(adapter.service_name, adapter.config, discovery_results)
         
-        return discovery_results
\ No newline at end of file
+        return discovery_results
+    
+    def discover_services(self, adapters: List[Any], force_refresh: bool = False) -> List[Optional[Dict[str, Any]]]:
+        """
+        Discover several services concurrently, with caching
+        
+        Args:
+            adapters: Service adapter instances
+            force_refresh: Force fresh discovery (bypass cache)
+            
+        Returns:
+            Discovery results in the order of ``adapters``; None where discovery failed
+        """
+        if not adapters:
+            return []
+            
+        def discover(adapter) -> Optional[Dict[str, Any]]:
+            try:
+                return self.discover_service(adapter, force_refresh)
+            except Exception as e:
+                logger.error(f"Discovery failed for {adapter.service_name}: {e}")
+                return None
+                
+        with ThreadPoolExecutor(max_workers=min(len(adapters), MAX_DISCOVERY_WORKERS)) as executor:
+            return list(executor.map(discover, adapters))
\ No newline at end of file
@@ -6,19 +6,20 @@ from typing import Any, Dict, List, Optional
 from drbench.agents.drbench_agent.agent_tools.content_processor import ContentProcessor
 
 from .base import ResearchContext, Tool
-from .enterprise.adapters import EmailAdapter, FileBrowserAdapter, MattermostAdapter, NextcloudAdapter
+from .enterprise import adapters as enterprise_adapters
 from .enterprise.discovery import DiscoveryCache, ServiceDiscovery
 from .enterprise.utils import extract_search_terms
 
 logger = logging.getLogger(__name__)
 
 
-# Service adapter registry
+# Service adapter registry: service name -> adapter class name in .enterprise.adapters,
+# which imports each adapter module (and its dependencies) on first use
 SERVICE_ADAPTERS = {
-    "nextcloud": NextcloudAdapter,
-    "mattermost": MattermostAdapter,
-    "filebrowser": FileBrowserAdapter,
-    "email_imap": EmailAdapter,
+    "nextcloud": "NextcloudAdapter",
+    "mattermost": "MattermostAdapter",
+    "filebrowser": "FileBrowserAdapter",
+    "email_imap": "EmailAdapter",
 }
 
 
@@ -144,7 +145,7 @@ class EnterpriseAPITool(Tool):
 
     def _get_or_create_adapters(self, available_apps: Dict) -> Dict[str, Any]:
         """Get or create service adapters for available apps"""
-        adapters = {}
+        new_adapters = {}
 
         for name, config in available_apps.items():
             service_name = name.lower()
@@ -155,22 +156,22 @@ class EnterpriseAPITool(Tool):
                 continue
 
             # Use cached adapter or create new one
-            if service_name not in self._adapters:
+            if service_name not in self._adapters and service_name not in new_adapters:
                 try:
-                    adapter_class = SERVICE_ADAPTERS[service_name]
-                    adapter = adapter_class(config)
-
-                    # Discover capabilities with caching
-                    self.service_discovery.discover_service(adapter)
-
-                    self._adapters[service_name] = adapter
+                    adapter_class = getattr(enterprise_adapters, SERVICE_ADAPTERS[service_name])
+                    new_adapters[service_name] = adapter_class(config)
                 except Exception as e:
                     logger.error(f"Failed to create adapter for {name}: {e}")
-                    continue
 
-            adapters[service_name] = self._adapters[service_name]
+        # Discover capabilities of the new adapters concurrently, with caching
+        discovered = self.service_discovery.discover_services(list(new_adapters.values()))
+        for (service_name, adapter), discovery_results in zip(new_adapters.items(), discovered):
+            if discovery_results is not None:
+                self._adapters[service_name] = adapter
 
-        return adapters
+        return {
+            name.lower(): self._adapters[name.lower()] for name in available_apps if name.lower() in self._adapters
+        }
 
     def _process_file(self, adapter, file_info: Dict, query: str, context: ResearchContext) -> Optional[Dict]:
         """Download and process a file using the content processor"""
@@ -181,21 +182,26 @@ class EnterpriseAPITool(Tool):
             if not file_path:
                 return None
 
-            # Download file
-            download_result = adapter.download_file(file_path)
-            if not download_result.get("success"):
-                return None
-
-            # Save to temp file and process
+            # Download to a temp file and process
             import os
             import tempfile
 
             _, ext = os.path.splitext(file_name)
             with tempfile.NamedTemporaryFile(delete=False, suffix=ext or ".txt", mode="wb") as temp_file:
-                temp_file.write(download_result["content"])
                 temp_file_path = temp_file.name
 
             try:
+                if hasattr(adapter, "download_file_to"):
+                    # Adapter can write the body straight to disk
+                    download_result = adapter.download_file_to(file_path, temp_file_path)
+                else:
+                    download_result = adapter.download_file(file_path)
+                    if download_result.get("success"):
+                        with open(temp_file_path, "wb") as temp_file:
+                            temp_file.write(download_result["content"])
+                if not download_result.get("success"):
+                    return None
+
                 # Process with content processor
                 result = self.content_processor.process_file(
                     file_path=temp_file_path,
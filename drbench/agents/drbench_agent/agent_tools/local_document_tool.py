@@ -284,6 +284,7 @@ class LocalDocumentIngestionTool:
                         else str(file_path.name)
                     ),
                 },
+                persist_extracted=False,  # Only the doc_id is used; skip the extra copy on disk
             )
 
             if result.get("success"):
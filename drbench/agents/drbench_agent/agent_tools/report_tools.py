@@ -1484,6 +1484,9 @@ Return only the queries, one per line. Do not include any additional text, enume
         # Use unified citation registry for final citation resolution
         final_report, citation_assignments = self.citation_registry.finalize_citations(main_report)
 
+        # Citations are final for this report; only read-only lookups follow
+        self.citation_registry.freeze()
+
         # Generate references section using unified registry
         references_section = self.citation_registry.generate_references_section()
 
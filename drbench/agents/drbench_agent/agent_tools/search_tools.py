@@ -79,15 +79,18 @@ class InternetSearchTool(Tool):
             if self.content_processor and search_results:
                 logger.info(f"🌐 Fetching content from top {min(5, len(search_results))} search results...")
                 
-                for i, result in enumerate(search_results[:5]):  # Fetch top 5 URLs
+                top_results = search_results[:5]  # Fetch top 5 URLs
+                # Use content processor to fetch and store URL content, all URLs concurrently
+                content_results = iter(self.content_processor.process_urls(
+                    [result["link"] for result in top_results if result.get("link")],
+                    query_context=f"Search query: {query}"
+                ))
+
+                for i, result in enumerate(top_results):
                     url = result.get("link")
                     if url:
                         try:
-                            # Use content processor to fetch and store URL content
-                            content_result = self.content_processor.process_url(
-                                url=url,
-                                query_context=f"Search query: {query}"
-                            )
+                            content_result = next(content_results)
                             
                             if content_result.get("success"):
                                 fetched_content.append({
@@ -51,13 +51,13 @@ class EnhancedURLFetchTool(Tool):
             results = []
             processed_files = []
 
-            for url in urls[:5]:  # Limit to 5 URLs
-                # Process the URL using content processor
-                process_result = self.content_processor.process_url(
-                    url,
-                    query_context=f"Query: {query} | Original question: {context.original_question}",
-                )
+            # Process the URLs concurrently using content processor
+            process_results = self.content_processor.process_urls(
+                urls[:5],  # Limit to 5 URLs
+                query_context=f"Query: {query} | Original question: {context.original_question}",
+            )
 
+            for process_result in process_results:
                 results.append(process_result)
 
                 # Track successfully processed files
@@ -7,6 +7,7 @@ during a research session. It tracks:
 - Content by hash (SHA-256) to identify identical content
 - Source identifiers (file paths, post IDs) to avoid re-processing same sources  
 - File paths to prevent re-downloading of files
+- Raw payload hashes so identical bytes under another URL/path skip re-extraction
 - Query contexts to merge related research queries
 - Access patterns for analytics
 
@@ -15,28 +16,63 @@ When a document is accessed multiple times, the cache:
 2. Merges query contexts from multiple research queries
 3. Updates access counts and timestamps
 4. Preserves all research context for better citations
+
+Each ledger keeps at most max_entries items, evicting the least recently used, so a
+long-running session cannot grow without bound; an evicted document is at worst
+processed again and then deduplicated by the vector store.
 """
 
 import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Optional, Set, Tuple
+from typing import Any, Dict, Optional, Set, Tuple
+
+# Default bound on the entries kept by each ledger; least recently used entries are evicted
+SESSION_CACHE_MAX_ENTRIES = 100_000
+
+
+class BoundedLedger(OrderedDict):
+    """Dict holding at most max_entries items, evicting the least recently used on insert
+    
+    Lookups through get() count as a use. Callers serialize access (SessionCache holds its lock).
+    """
+    
+    def __init__(self, max_entries: int):
+        super().__init__()
+        self.max_entries = max_entries
+        
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+    
+    def __setitem__(self, key: Any, value: Any):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.max_entries:
+            self.popitem(last=False)
 
 
 class SessionCache:
     """In-memory cache for tracking processed content during a research session"""
     
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, max_entries: int = SESSION_CACHE_MAX_ENTRIES):
         self.session_id = session_id
         self.start_time = datetime.now()
+        self._lock = threading.RLock()  # Documents may be added from worker threads
         
-        # Caches for different types of content
-        self.content_cache: Dict[str, str] = {}  # content_hash -> doc_id
-        self.source_cache: Dict[str, str] = {}   # source_identifier -> doc_id
-        self.file_cache: Dict[str, Tuple[str, str]] = {}  # file_path -> (content_hash, doc_id)
+        # Caches for different types of content, each bounded to max_entries
+        self.content_cache: Dict[str, str] = BoundedLedger(max_entries)  # content_hash -> doc_id
+        self.source_cache: Dict[str, str] = BoundedLedger(max_entries)   # source_identifier -> doc_id
+        self.file_cache: Dict[str, Tuple[str, str]] = BoundedLedger(max_entries)  # file_path -> (content_hash, doc_id)
+        # payload_hash -> (doc_id, extracted_path, extracted_text_hash)
+        self.payload_cache: Dict[str, Tuple[str, str, str]] = BoundedLedger(max_entries)
         
         # Track access patterns
-        self.access_count: Dict[str, int] = {}
-        self.query_contexts: Dict[str, Set[str]] = {}  # doc_id -> set of query contexts
+        self.access_count: Dict[str, int] = BoundedLedger(max_entries)
+        self.query_contexts: Dict[str, Set[str]] = BoundedLedger(max_entries)  # doc_id -> set of query contexts
         
     def compute_content_hash(self, content: str) -> str:
         """Compute SHA-256 hash of content"""
@@ -58,7 +94,8 @@ class SessionCache:
             doc_id if content exists, None otherwise
         """
         content_hash = self.compute_content_hash(content)
-        return self.content_cache.get(content_hash)
+        with self._lock:
+            return self.content_cache.get(content_hash)
     
     def check_source(self, source_type: str, source_identifier: str) -> Optional[str]:
         """
@@ -72,7 +109,8 @@ class SessionCache:
             doc_id if source exists, None otherwise
         """
         source_hash = self.compute_source_hash(source_type, source_identifier)
-        return self.source_cache.get(source_hash)
+        with self._lock:
+            return self.source_cache.get(source_hash)
     
     def check_file(self, file_path: str) -> Optional[Tuple[str, str]]:
         """
@@ -84,7 +122,31 @@ class SessionCache:
         Returns:
             Tuple of (content_hash, doc_id) if file exists, None otherwise
         """
-        return self.file_cache.get(file_path)
+        with self._lock:
+            return self.file_cache.get(file_path)
+    
+    def check_payload(self, payload_hash: str) -> Optional[Tuple[str, str, str]]:
+        """
+        Check if a raw file payload has been processed before
+        
+        Args:
+            payload_hash: SHA-256 hex digest of the downloaded/read file bytes
+            
+        Returns:
+            Tuple of (doc_id, extracted_path, extracted_text_hash) if payload exists, None otherwise
+        """
+        with self._lock:
+            return self.payload_cache.get(payload_hash)
+    
+    def add_payload(self, payload_hash: str, doc_id: str, extracted_path: str, extracted_content: str):
+        """Record the document and extracted text produced from a raw file payload
+        
+        The text's hash is kept so a reader can tell if extracted_path was since overwritten
+        by another document's text.
+        """
+        text_hash = self.compute_content_hash(extracted_content)
+        with self._lock:
+            self.payload_cache[payload_hash] = (doc_id, extracted_path, text_hash)
     
     def add_document(
         self, 
@@ -107,54 +169,61 @@ class SessionCache:
             query_context: Research query context
         """
         content_hash = self.compute_content_hash(content)
+
+        with self._lock:
+            # Add to content cache
+            self.content_cache[content_hash] = doc_id
         
-        # Add to content cache
-        self.content_cache[content_hash] = doc_id
-        
-        # Add to source cache if provided
-        if source_type and source_identifier:
-            source_hash = self.compute_source_hash(source_type, source_identifier)
-            self.source_cache[source_hash] = doc_id
+            # Add to source cache if provided
+            if source_type and source_identifier:
+                source_hash = self.compute_source_hash(source_type, source_identifier)
+                self.source_cache[source_hash] = doc_id
         
-        # Add to file cache if provided
-        if file_path:
-            self.file_cache[file_path] = (content_hash, doc_id)
+            # Add to file cache if provided
+            if file_path:
+                self.file_cache[file_path] = (content_hash, doc_id)
         
-        # Track access
-        self.access_count[doc_id] = self.access_count.get(doc_id, 0) + 1
+            # Track access
+            self.access_count[doc_id] = self.access_count.get(doc_id, 0) + 1
         
-        # Track query contexts
-        if query_context:
-            if doc_id not in self.query_contexts:
-                self.query_contexts[doc_id] = set()
-            self.query_contexts[doc_id].add(query_context)
+            # Track query contexts
+            if query_context:
+                contexts = self.query_contexts.get(doc_id) or set()
+                contexts.add(query_context)
+                self.query_contexts[doc_id] = contexts
     
     def get_merged_contexts(self, doc_id: str) -> list:
         """Get all query contexts for a document"""
-        return list(self.query_contexts.get(doc_id, set()))
+        with self._lock:
+            return list(self.query_contexts.get(doc_id, set()))
     
     def get_access_count(self, doc_id: str) -> int:
         """Get access count for a document"""
-        return self.access_count.get(doc_id, 0)
+        with self._lock:
+            return self.access_count.get(doc_id, 0)
     
     def get_stats(self) -> Dict:
         """Get cache statistics"""
-        return {
-            "session_id": self.session_id,
-            "start_time": self.start_time.isoformat(),
-            "duration_seconds": (datetime.now() - self.start_time).total_seconds(),
-            "unique_documents": len(set(self.content_cache.values())),
-            "content_hashes": len(self.content_cache),
-            "source_entries": len(self.source_cache),
-            "file_entries": len(self.file_cache),
-            "total_accesses": sum(self.access_count.values()),
-            "duplicate_preventions": sum(c - 1 for c in self.access_count.values() if c > 1)
-        }
+        with self._lock:
+            return {
+                "session_id": self.session_id,
+                "start_time": self.start_time.isoformat(),
+                "duration_seconds": (datetime.now() - self.start_time).total_seconds(),
+                "unique_documents": len(set(self.content_cache.values())),
+                "content_hashes": len(self.content_cache),
+                "source_entries": len(self.source_cache),
+                "file_entries": len(self.file_cache),
+                "payload_entries": len(self.payload_cache),
+                "total_accesses": sum(self.access_count.values()),
+                "duplicate_preventions": sum(c - 1 for c in self.access_count.values() if c > 1)
+            }
     
     def clear(self):
         """Clear all caches"""
-        self.content_cache.clear()
-        self.source_cache.clear()
-        self.file_cache.clear()
-        self.access_count.clear()
-        self.query_contexts.clear()
\ No newline at end of file
+        with self._lock:
+            self.content_cache.clear()
+            self.source_cache.clear()
+            self.file_cache.clear()
+            self.payload_cache.clear()
+            self.access_count.clear()
+            self.query_contexts.clear()
\ No newline at end of file
@@ -1,3 +1,4 @@
+import contextlib
 import hashlib
 import json
 import logging
@@ -12,6 +13,9 @@ from drbench.agents.drbench_agent.session_cache import SessionCache
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of texts sent in a single embeddings request
+EMBEDDING_BATCH_SIZE = 256
+
 
 def get_embeddings(texts: List[str], model: str = "text-embedding-ada-002") -> List[List[float]]:
     """
@@ -92,6 +96,13 @@ def _get_embeddings_local(texts: List[str], model: str) -> List[List[float]]:
         raise Exception(f"SentenceTransformer embedding error: {e}")
 
 
+class _MetadataSaveBatch:
+    """Metadata merges deferred by one deferred_metadata_saves() block"""
+
+    def __init__(self):
+        self.dirty = False  # Merged metadata not yet written to disk
+
+
 class VectorStore:
     """Production-ready vector store for document storage and semantic search"""
 
@@ -107,6 +118,7 @@ class VectorStore:
         self.max_length = max_length
         self.session_cache = session_cache
         self._lock = threading.RLock()  # Reentrant lock for thread safety
+        self._save_batches = threading.local()  # Per-thread deferred_metadata_saves() batch
         os.makedirs(storage_dir, exist_ok=True)
 
         # Storage files
@@ -164,6 +176,28 @@ class VectorStore:
             except Exception as e:
                 logger.error(f"Error saving vector store data: {e}")
 
+    @contextlib.contextmanager
+    def deferred_metadata_saves(self, batch: Optional[_MetadataSaveBatch] = None):
+        """Write metadata merges made inside the block to disk once, when the outermost block exits
+
+        Every save rewrites the whole store, so a batch of cache hits would otherwise cost one full
+        rewrite per hit. Deferral only covers the calling thread; worker threads join a batch by
+        passing the object yielded by the outermost block, which remains the one that saves.
+        """
+        previous = getattr(self._save_batches, "current", None)
+        owns_batch = batch is None and previous is None
+        if batch is None:
+            batch = previous or _MetadataSaveBatch()
+        self._save_batches.current = batch
+        try:
+            yield batch
+        finally:
+            self._save_batches.current = previous
+            if owns_batch:
+                with self._lock:
+                    if batch.dirty:
+                        self._save_data()
+
     def _reset_store(self):
         """Reset the vector store"""
         self.documents = {}
@@ -214,6 +248,83 @@ class VectorStore:
 
         return None
 
+    def _resolve_duplicate(self, content: str, metadata: Dict) -> Optional[str]:
+        """Return the doc_id of an already stored copy of content, merging the new metadata into it
+
+        Caller must hold self._lock.
+        """
+        # Check session cache first if available
+        if self.session_cache:
+            cached_doc_id = self.session_cache.check_content(content)
+            if cached_doc_id:
+                # Update query contexts if new context provided
+                if "query_context" in metadata:
+                    self.session_cache.add_document(
+                        cached_doc_id,
+                        content,
+                        source_type=metadata.get("source"),
+                        source_identifier=metadata.get("source_identifier") or metadata.get("original_path"),
+                        query_context=metadata.get("query_context"),
+                    )
+                    # Update the stored document's metadata
+                    self._merge_metadata(cached_doc_id, metadata)
+                return cached_doc_id
+
+        # Check for duplicates in vector store
+        duplicate = self.find_duplicate(content, metadata)
+        if duplicate:
+            existing_doc_id, existing_doc = duplicate
+            # Merge metadata
+            self._merge_metadata(existing_doc_id, metadata)
+
+            # Add to session cache
+            if self.session_cache:
+                self.session_cache.add_document(
+                    existing_doc_id,
+                    content,
+                    source_type=metadata.get("source"),
+                    source_identifier=metadata.get("source_identifier") or metadata.get("original_path"),
+                    file_path=metadata.get("file_path"),
+                    query_context=metadata.get("query_context"),
+                )
+
+            return existing_doc_id
+
+        return None
+
+    def _add_document_record(self, doc_id: str, content: str, metadata: Dict):
+        """Record a new document (without its embedding) and register it with the session cache
+
+        Caller must hold self._lock.
+        """
+        # Add content hash to metadata
+        metadata["content_hash"] = self._compute_content_hash(content)
+        metadata["first_seen"] = datetime.now().isoformat()
+        metadata["access_count"] = 1
+
+        # Initialize merged_contexts if query_context provided
+        if "query_context" in metadata and metadata["query_context"]:
+            metadata["merged_contexts"] = [metadata["query_context"]]
+
+        # Store document metadata
+        self.documents[doc_id] = {
+            "content": content,
+            "metadata": metadata,
+            "timestamp": datetime.now().isoformat(),
+            "content_preview": content[:300] + "..." if len(content) > 300 else content,
+        }
+
+        # Add to session cache
+        if self.session_cache:
+            self.session_cache.add_document(
+                doc_id,
+                content,
+                source_type=metadata.get("source"),
+                source_identifier=metadata.get("source_identifier") or metadata.get("original_path"),
+                file_path=metadata.get("file_path"),
+                query_context=metadata.get("query_context"),
+            )
+
     def store_document(
         self, content: str, metadata: Dict = None, doc_id: str = None, check_duplicates: bool = True
     ) -> str:
@@ -232,97 +343,43 @@ class VectorStore:
             if metadata is None:
                 metadata = {}
 
-            # Check session cache first if available
-            if self.session_cache and check_duplicates:
-                cached_doc_id = self.session_cache.check_content(content)
-                if cached_doc_id:
-                    # Update query contexts if new context provided
-                    if "query_context" in metadata:
-                        self.session_cache.add_document(
-                            cached_doc_id,
-                            content,
-                            source_type=metadata.get("source"),
-                            source_identifier=metadata.get("source_identifier") or metadata.get("original_path"),
-                            query_context=metadata.get("query_context"),
-                        )
-                        # Update the stored document's metadata
-                        self._merge_metadata(cached_doc_id, metadata)
-                    return cached_doc_id
-
-            # Check for duplicates in vector store
             if check_duplicates:
-                duplicate = self.find_duplicate(content, metadata)
-                if duplicate:
-                    existing_doc_id, existing_doc = duplicate
-                    # Merge metadata
-                    self._merge_metadata(existing_doc_id, metadata)
-
-                    # Add to session cache
-                    if self.session_cache:
-                        self.session_cache.add_document(
-                            existing_doc_id,
-                            content,
-                            source_type=metadata.get("source"),
-                            source_identifier=metadata.get("source_identifier") or metadata.get("original_path"),
-                            file_path=metadata.get("file_path"),
-                            query_context=metadata.get("query_context"),
-                        )
-
+                existing_doc_id = self._resolve_duplicate(content, metadata)
+                if existing_doc_id:
                     return existing_doc_id
 
             # Generate new doc ID if not provided
             if doc_id is None:
                 doc_id = self._generate_doc_id(content, metadata)
 
-            # Add content hash to metadata
-            metadata["content_hash"] = self._compute_content_hash(content)
-            metadata["first_seen"] = datetime.now().isoformat()
-            metadata["access_count"] = 1
-
-            # Initialize merged_contexts if query_context provided
-            if "query_context" in metadata and metadata["query_context"]:
-                metadata["merged_contexts"] = [metadata["query_context"]]
-
-            # Store document metadata
-            self.documents[doc_id] = {
-                "content": content,
-                "metadata": metadata,
-                "timestamp": datetime.now().isoformat(),
-                "content_preview": content[:300] + "..." if len(content) > 300 else content,
-            }
+            # Recorded before embedding, so concurrent stores of the same content resolve to this doc_id
+            self._add_document_record(doc_id, content, metadata)
 
-            # Add to session cache
-            if self.session_cache:
-                self.session_cache.add_document(
-                    doc_id,
-                    content,
-                    source_type=metadata.get("source"),
-                    source_identifier=metadata.get("source_identifier") or metadata.get("original_path"),
-                    file_path=metadata.get("file_path"),
-                    query_context=metadata.get("query_context"),
-                )
-
-            # Generate embedding for the content
-            try:
-                embedding = get_embeddings([content[: self.max_length]], self.embedding_model)[0]
-
-                # Add to embeddings matrix
-                if self.embeddings is None:
-                    self.embeddings = np.array([embedding])
-                    self.doc_ids = [doc_id]
-                else:
-                    self.embeddings = np.vstack([self.embeddings, embedding])
-                    self.doc_ids.append(doc_id)
-
-                # Save to disk
-                self._save_data()
+        # Generate embedding for the content without holding the lock, so other stores and
+        # searches are not blocked behind the embedding call
+        try:
+            embedding = get_embeddings([content[: self.max_length]], self.embedding_model)[0]
+
+            with self._lock:
+                # The document may have been deleted while its embedding was computed
+                if doc_id in self.documents:
+                    # Add to embeddings matrix
+                    if self.embeddings is None:
+                        self.embeddings = np.array([embedding])
+                        self.doc_ids = [doc_id]
+                    else:
+                        self.embeddings = np.vstack([self.embeddings, embedding])
+                        self.doc_ids.append(doc_id)
+
+                    # Save to disk
+                    self._save_data()
 
-            except NotImplementedError:
-                logger.warning("Warning: Embedding function not implemented. Using keyword-based storage only.")
-            except Exception as e:
-                logger.error(f"Error generating embeddings: {e}")
+        except NotImplementedError:
+            logger.warning("Warning: Embedding function not implemented. Using keyword-based storage only.")
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {e}")
 
-            return doc_id
+        return doc_id
 
     def _merge_metadata(self, doc_id: str, new_metadata: Dict):
         """Merge new metadata into existing document
@@ -331,39 +388,52 @@ class VectorStore:
             doc_id: Document ID
             new_metadata: New metadata to merge
         """
-        if doc_id not in self.documents:
-            return
-
-        existing_metadata = self.documents[doc_id].get("metadata", {})
-
-        # Update access count
-        existing_metadata["access_count"] = existing_metadata.get("access_count", 1) + 1
-        existing_metadata["last_accessed"] = datetime.now().isoformat()
-
-        # Merge query contexts
-        if "query_context" in new_metadata and new_metadata["query_context"]:
-            if "merged_contexts" not in existing_metadata:
-                existing_metadata["merged_contexts"] = []
-            if new_metadata["query_context"] not in existing_metadata["merged_contexts"]:
-                existing_metadata["merged_contexts"].append(new_metadata["query_context"])
-
-        # Update other metadata fields if they provide new information
-        for key, value in new_metadata.items():
-            if key not in ["query_context", "timestamp", "first_seen", "access_count", "merged_contexts"]:
-                if key not in existing_metadata or existing_metadata[key] != value:
-                    # For certain fields, keep a history
-                    if key in ["tool_used", "source"]:
-                        history_key = f"{key}_history"
-                        if history_key not in existing_metadata:
-                            existing_metadata[history_key] = (
-                                [existing_metadata.get(key)] if key in existing_metadata else []
-                            )
-                        if value not in existing_metadata[history_key]:
-                            existing_metadata[history_key].append(value)
-                    existing_metadata[key] = value
-
-        # Save updated data
-        self._save_data()
+        with self._lock:
+            if doc_id not in self.documents:
+                return
+
+            existing_metadata = self.documents[doc_id].get("metadata", {})
+
+            # Update access count
+            existing_metadata["access_count"] = existing_metadata.get("access_count", 1) + 1
+            existing_metadata["last_accessed"] = datetime.now().isoformat()
+
+            # Merge query contexts
+            if "query_context" in new_metadata and new_metadata["query_context"]:
+                if "merged_contexts" not in existing_metadata:
+                    existing_metadata["merged_contexts"] = []
+                if new_metadata["query_context"] not in existing_metadata["merged_contexts"]:
+                    existing_metadata["merged_contexts"].append(new_metadata["query_context"])
+
+            # Accumulate other sources that yielded the same document
+            for alias in new_metadata.get("source_aliases", []):
+                aliases = existing_metadata.setdefault("source_aliases", [])
+                if alias != existing_metadata.get("source_identifier") and alias not in aliases:
+                    aliases.append(alias)
+
+            # Update other metadata fields if they provide new information
+            for key, value in new_metadata.items():
+                if key not in [
+                    "query_context", "timestamp", "first_seen", "access_count", "merged_contexts", "source_aliases"
+                ]:
+                    if key not in existing_metadata or existing_metadata[key] != value:
+                        # For certain fields, keep a history
+                        if key in ["tool_used", "source"]:
+                            history_key = f"{key}_history"
+                            if history_key not in existing_metadata:
+                                existing_metadata[history_key] = (
+                                    [existing_metadata.get(key)] if key in existing_metadata else []
+                                )
+                            if value not in existing_metadata[history_key]:
+                                existing_metadata[history_key].append(value)
+                        existing_metadata[key] = value
+
+            # Save updated data, unless this thread's batch will save it on completion
+            batch = getattr(self._save_batches, "current", None)
+            if batch is not None:
+                batch.dirty = True
+            else:
+                self._save_data()
 
     def semantic_search(self, query: str, top_k: int = 5, threshold: float = 0.7) -> List[Dict]:
         """Perform semantic search using embeddings"""
@@ -452,6 +522,11 @@ class VectorStore:
 
     def delete_document(self, doc_id: str) -> bool:
         """Delete a document from the vector store"""
+        with self._lock:
+            return self._delete_document(doc_id)
+
+    def _delete_document(self, doc_id: str) -> bool:
+        """Delete a document; caller must hold self._lock"""
         if doc_id not in self.documents:
             return False
 
@@ -495,37 +570,60 @@ class VectorStore:
                 total_size += os.path.getsize(file_path)
         return round(total_size / (1024 * 1024), 2)
 
-    def batch_store_documents(self, documents: List[Dict]) -> List[str]:
-        """Store multiple documents efficiently"""
-        doc_ids = []
-        contents = []
+    def batch_store_documents(self, documents: List[Dict], check_duplicates: bool = False) -> List[str]:
+        """Store multiple documents efficiently
 
-        # Prepare documents
-        for doc in documents:
-            content = doc.get("content", "")
-            metadata = doc.get("metadata", {})
-            doc_id = doc.get("doc_id") or self._generate_doc_id(content, metadata)
+        Embeddings for all new documents are requested in batches of EMBEDDING_BATCH_SIZE
+        and the store is saved once at the end.
 
-            self.documents[doc_id] = {
-                "content": content,
-                "metadata": metadata,
-                "timestamp": datetime.now().isoformat(),
-                "content_preview": content[:300] + "..." if len(content) > 300 else content,
-            }
+        Args:
+            documents: Dicts with "content", optional "metadata" and optional "doc_id"
+            check_duplicates: Resolve already stored content to its existing doc_id, as store_document does
 
-            doc_ids.append(doc_id)
-            contents.append(content[: self.max_length])  # Truncate to max length
+        Returns:
+            Document IDs, one per input document
+        """
+        with self._lock:
+            doc_ids = []
+            new_doc_ids = []
+            contents = []
 
-        # Generate embeddings in batch
-        try:
-            embeddings = get_embeddings(contents, self.embedding_model)
+            # Prepare documents
+            for doc in documents:
+                content = doc.get("content", "")
+                metadata = doc.get("metadata", {})
 
-            if self.embeddings is None:
-                self.embeddings = np.array(embeddings)
-                self.doc_ids = doc_ids.copy()
-            else:
-                self.embeddings = np.vstack([self.embeddings, np.array(embeddings)])
-                self.doc_ids.extend(doc_ids)
+                if check_duplicates:
+                    existing_doc_id = self._resolve_duplicate(content, metadata)
+                    if existing_doc_id:
+                        doc_ids.append(existing_doc_id)
+                        continue
+
+                doc_id = doc.get("doc_id") or self._generate_doc_id(content, metadata)
+                self._add_document_record(doc_id, content, metadata)
+
+                doc_ids.append(doc_id)
+                new_doc_ids.append(doc_id)
+                contents.append(content[: self.max_length])  # Truncate to max length
+
+        # Generate embeddings in batch, without holding the lock
+        try:
+            embeddings = []
+            for start in range(0, len(contents), EMBEDDING_BATCH_SIZE):
+                batch = contents[start : start + EMBEDDING_BATCH_SIZE]
+                embeddings.extend(get_embeddings(batch, self.embedding_model))
+
+            with self._lock:
+                # Skip documents deleted while their embeddings were computed
+                kept = [i for i, doc_id in enumerate(new_doc_ids[: len(embeddings)]) if doc_id in self.documents]
+                if kept:
+                    new_embeddings = np.array([embeddings[i] for i in kept])
+                    if self.embeddings is None:
+                        self.embeddings = new_embeddings
+                        self.doc_ids = [new_doc_ids[i] for i in kept]
+                    else:
+                        self.embeddings = np.vstack([self.embeddings, new_embeddings])
+                        self.doc_ids.extend(new_doc_ids[i] for i in kept)
 
         except NotImplementedError:
             logger.warning("Warning: Embedding function not implemented.")
@@ -567,39 +665,40 @@ class VectorStore:
                 content_groups[content_hash] = []
             content_groups[content_hash].append(doc_id)
 
-        # Process duplicates
+        # Process duplicates (merges are written once for the batch, not per duplicate)
         docs_to_remove = []
-        for content_hash, doc_ids in content_groups.items():
-            if len(doc_ids) > 1:
-                stats["duplicates_found"] += len(doc_ids) - 1
-
-                # Sort by access time or creation time
-                if preserve_latest:
-                    doc_ids.sort(
-                        key=lambda d: self.documents[d]["metadata"].get(
-                            "last_accessed", self.documents[d]["metadata"].get("timestamp", "")
-                        ),
-                        reverse=True,
-                    )
-                else:
-                    # Sort by first seen
-                    doc_ids.sort(
-                        key=lambda d: self.documents[d]["metadata"].get(
-                            "first_seen", self.documents[d]["metadata"].get("timestamp", "")
+        with self.deferred_metadata_saves():
+            for content_hash, doc_ids in content_groups.items():
+                if len(doc_ids) > 1:
+                    stats["duplicates_found"] += len(doc_ids) - 1
+
+                    # Sort by access time or creation time
+                    if preserve_latest:
+                        doc_ids.sort(
+                            key=lambda d: self.documents[d]["metadata"].get(
+                                "last_accessed", self.documents[d]["metadata"].get("timestamp", "")
+                            ),
+                            reverse=True,
+                        )
+                    else:
+                        # Sort by first seen
+                        doc_ids.sort(
+                            key=lambda d: self.documents[d]["metadata"].get(
+                                "first_seen", self.documents[d]["metadata"].get("timestamp", "")
+                            )
                         )
-                    )
 
-                # Keep the first one, merge metadata from others
-                primary_doc_id = doc_ids[0]
+                    # Keep the first one, merge metadata from others
+                    primary_doc_id = doc_ids[0]
 
-                for duplicate_doc_id in doc_ids[1:]:
-                    # Merge metadata
-                    duplicate_metadata = self.documents[duplicate_doc_id].get("metadata", {})
-                    self._merge_metadata(primary_doc_id, duplicate_metadata)
+                    for duplicate_doc_id in doc_ids[1:]:
+                        # Merge metadata
+                        duplicate_metadata = self.documents[duplicate_doc_id].get("metadata", {})
+                        self._merge_metadata(primary_doc_id, duplicate_metadata)
 
-                    # Mark for removal
-                    docs_to_remove.append(duplicate_doc_id)
-                    stats["documents_merged"] += 1
+                        # Mark for removal
+                        docs_to_remove.append(duplicate_doc_id)
+                        stats["documents_merged"] += 1
 
         # Remove duplicate documents and their embeddings
         for doc_id in docs_to_remove: